@@ -1,18 +1,29 @@
 # app/api/endpoints/import.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Form
-from fastapi.responses import JSONResponse
-from typing import Dict, List, Any, Optional, Union
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List, Any, Optional, Tuple, Union
 import logging
 from io import BytesIO
+from pathlib import Path
 import asyncio
+import hashlib
 import json
+import os
+import shutil
+import tempfile
+import uuid
 
 from app.models.models_catalog.cat_products_brands import Cat_ProductBrand
 from app.services.excel_import_service import ExcelImportService
-from app.services.table_import_schema_service import TableImportSchemaService
+from app.services.excel_parsing_service import excel_parser, ParserBusyError
+from app.services.parsed_upload_cache import parsed_upload_cache
+from app.services.import_job_service import import_job_registry, FINISHED_STATES
+from app.services.import_worker import IMPORTERS, notify_api_import_worker
+from app.services.table_import_schema_service import table_import_schema_service
 # from app.services.DEL_external_mapping_service import ExternalMappingService
 from app.services.enumeration_service import EnumerationService
 from app.core.security import get_current_user
+from app.core.config import settings
 from app.db.database import db_manager
 
 logger = logging.getLogger(__name__)
@@ -21,10 +32,64 @@ router = APIRouter()
 
 # Initialize services
 excel_service = ExcelImportService()
-schema_service = TableImportSchemaService()
+schema_service = table_import_schema_service
 mapping_service = None  # ExternalMappingService()
 enum_service = EnumerationService()
 
+UPLOAD_READ_CHUNK = 1024 * 1024
+PREVIEW_ROWS = 10
+
+def spool_dir() -> Optional[str]:
+    # Абсолютний шлях: задача в черзі може виконуватись воркером з іншим робочим каталогом
+    return os.path.abspath(settings.IMPORT_SPOOL_DIR) if settings.IMPORT_SPOOL_DIR else None
+
+async def spool_upload(file: UploadFile, max_size: int) -> Tuple[str, str]:
+    """Save upload to a temporary file without holding the whole file in memory, returns absolute path and content SHA-256"""
+    directory = spool_dir()
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(
+        prefix="import_",
+        suffix=Path(file.filename or "").suffix.lower(),
+        dir=directory
+    )
+    # Хеш рахується під час запису - ключ кешу розібраних файлів без повторного читання
+    content_hash = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as spool_file:
+            while True:
+                chunk = await file.read(UPLOAD_READ_CHUNK)
+                if not chunk:
+                    break
+                # Завелике завантаження не дописується на диск до кінця
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail=f"File too large (max: {max_size} bytes)")
+                content_hash.update(chunk)
+                spool_file.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, content_hash.hexdigest()
+
+def copy_spool_file(file_path: str) -> str:
+    """Copy spooled upload for one more import job"""
+    fd, path = tempfile.mkstemp(prefix="import_", suffix=Path(file_path).suffix, dir=spool_dir())
+    os.close(fd)
+    shutil.copyfile(file_path, path)
+    return path
+
+def sheet_index(sheet_name: Optional[Union[str, int]]) -> Optional[Union[str, int]]:
+    """Form/query value "0" -> 0: номер аркуша, як і в pandas, і той самий ключ кешу розібраних файлів"""
+    if isinstance(sheet_name, str) and sheet_name.isdecimal():
+        return int(sheet_name)
+    return sheet_name
+
+def parser_busy_response(e: ParserBusyError) -> HTTPException:
+    logger.warning(f"Rejecting upload: {e}")
+    return HTTPException(status_code=429, detail="Import parser is busy, retry later", headers={"Retry-After": "5"})
+
 @router.get("/tables", response_model=List[str])
 async def get_importable_tables():
     """Get list of tables available for import"""
@@ -57,40 +122,30 @@ async def preview_excel_file(
     sheet_name: Optional[str] = None
 ):
     """Preview Excel file content and suggest column mapping"""
+    file_path = None
     try:
-        # Read file content
-        file_content = await file.read()
+        # Save upload to disk, parsing runs in a separate process
+        file_path, content_hash = await spool_upload(file, excel_service.max_source_size(file.filename))
         
-        # Validate file
-        validation_result = excel_service.validate_file(file_content, file.filename)
-        if not validation_result['valid']:
+        # Validate and read file in one pass (the same file uploaded again is taken from cache)
+        excel_data = await excel_parser.parse_upload(file_path, file.filename, sheet_index(sheet_name), content_hash=content_hash)
+        if not excel_data['valid']:
             return JSONResponse(
                 status_code=400,
                 content={
                     "valid": False,
-                    "errors": validation_result['errors'],
-                    "warnings": validation_result.get('warnings', [])
-                }
-            )
-        
-        # Read Excel data
-        excel_data = excel_service.read_excel_file(file_content, file.filename, sheet_name)
-        if not excel_data['success']:
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "valid": False,
-                    "errors": excel_data['errors']
+                    "errors": excel_data['errors'],
+                    "warnings": excel_data.get('warnings', [])
                 }
             )
         
         result = {
             "valid": True,
-            "file_info": validation_result['file_info'],
-            "sheets": excel_data.get('sheets', []),
-            "preview_data": excel_data.get('preview_data', []),
-            "columns": excel_data.get('columns', []),
-            "total_rows": excel_data.get('total_rows', 0)
+            "file_info": excel_data['file_info'],
+            "sheets": excel_data['file_info'].get('sheets', []),
+            "preview_data": excel_data['data'][:PREVIEW_ROWS],
+            "columns": excel_data['columns'],
+            "total_rows": excel_data['row_count']
         }
         
         # Add column mapping suggestions if table specified
@@ -106,9 +161,16 @@ async def preview_excel_file(
         
         return result
         
+    except HTTPException:
+        raise
+    except ParserBusyError as e:
+        raise parser_busy_response(e)
     except Exception as e:
         logger.error(f"Error previewing Excel file: {e}")
         raise HTTPException(status_code=500, detail="Failed to preview Excel file")
+    finally:
+        if file_path:
+            os.remove(file_path)
 
 @router.post("/excel")
 async def import_excel_file(
@@ -122,19 +184,31 @@ async def import_excel_file(
 ):
     """Import Excel file by import_type (multi-table logic)"""
     try:
-        # 1. Зчитати файл
-        file_content = await file.read()
-        excel_data = excel_service.read_excel_file(file_content, file.filename, sheet_name)
-        if not excel_data['success']:
-            raise HTTPException(status_code=400, detail="Excel read error")
-
-        # 2. Визначити конфігурацію по import_type
+        # 1. Визначити конфігурацію по import_type
         config = get_import_config(import_type)
+        if not config:
+            raise HTTPException(status_code=400, detail=f"Unknown import type: {import_type}")
+
+        # 2. Зберегти файл на диск - дані читаються порціями у фоновій задачі (свій, більший ліміт розміру)
+        file_path, content_hash = await spool_upload(file, excel_service.max_source_size(file.filename, streaming=True))
+        # Файл вже розібраний (наприклад, при preview) - задача візьме рядки з кешу, перевірка не потрібна
+        sheet_name = sheet_index(sheet_name)
+        parse_cache_key = parsed_upload_cache.make_key(content_hash, file.filename, sheet_name)
+        if not await asyncio.to_thread(parsed_upload_cache.contains, parse_cache_key):
+            try:
+                validation_result = await excel_parser.validate_file(file_path, file.filename, streaming=True)
+            except Exception:
+                os.remove(file_path)
+                raise
+            if not validation_result['valid']:
+                os.remove(file_path)
+                raise HTTPException(status_code=400, detail=validation_result['errors'])
 
-        # # 3. Для кожної таблиці виконати імпорт
+        # # 3. Для кожної таблиці поставити задачу в чергу
         task_ids = []
         for table_name, column_mapping in config['tables'].items():
-            task_id = f"import_{table_name}_{current_user['_id']}_{asyncio.get_event_loop().time()}"
+            # Час циклу подій не унікальний (однаковий у задач одного запиту, повторюється між процесами)
+            task_id = f"import_{table_name}_{current_user['_id']}_{uuid.uuid4().hex}"
             # background_tasks.add_task(
             #     process_excel_import,
             #     task_id=task_id,
@@ -147,32 +221,84 @@ async def import_excel_file(
             # )
             # task_ids.append(task_id)
 
-            if table_name == "cat_products_brands":
-                brands_schema = schema_service.get_table_import_info(table_name)
-                background_tasks.add_task(
-                    import_brands_data,
-                    task_id=task_id,
-                    brands_data=excel_data,
-                    table_schema=brands_schema,
-                    column_mapping=column_mapping,
-                    source_id=source_id,
-                    batch_size=batch_size,
-                    user_id=current_user['_id']
+            if table_name in IMPORTERS:
+                # Кожна задача видаляє свій файл після виконання
+                job_file_path = file_path if not task_ids else await asyncio.to_thread(copy_spool_file, file_path)
+                await import_job_registry.create(
+                    task_id, import_type, table_name, user_id=current_user['_id'], filename=file.filename,
+                    payload={
+                        "file_path": job_file_path,
+                        "sheet_name": sheet_name,
+                        "source_id": source_id,
+                        "batch_size": batch_size,
+                        "column_mapping": column_mapping,
+                        "parse_cache_key": parse_cache_key
+                    }
                 )
+                task_ids.append(task_id)
+                if not settings.IMPORT_USE_WORKER:
+                    notify_api_import_worker()
+
+        if not task_ids:
+            os.remove(file_path)
 
         return {
             "task_ids": task_ids,
-            "message": "Import started in background",
+            "message": "Import queued" if settings.IMPORT_USE_WORKER else "Import started in background",
             "import_type": import_type,
-            "status": "processing"
+            "status": "queued"
         }
 
     except HTTPException:
         raise
+    except ParserBusyError as e:
+        raise parser_busy_response(e)
     except Exception as e:
         logger.error(f"Error starting Excel import: {e}")
         raise HTTPException(status_code=500, detail="Failed to start import")
 
+@router.get("/jobs")
+async def get_import_jobs(current_user = Depends(get_current_user)):
+    """List import jobs (admins see all jobs)"""
+    user_id = None if current_user.get('is_admin') else current_user['_id']
+    return [job.to_dict() for job in await import_job_registry.list(user_id=user_id)]
+
+async def get_visible_job(job_id: str, current_user: Dict):
+    job = await import_job_registry.get(job_id)
+    if not job or (not current_user.get('is_admin') and job.user_id != current_user['_id']):
+        raise HTTPException(status_code=404, detail=f"Import job '{job_id}' not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_import_job(job_id: str, current_user = Depends(get_current_user)):
+    """Get import job state and progress"""
+    return (await get_visible_job(job_id, current_user)).to_dict()
+
+@router.get("/jobs/{job_id}/events")
+async def stream_import_job(job_id: str, request: Request, current_user = Depends(get_current_user)):
+    """Server-Sent Events stream with live job progress"""
+    await get_visible_job(job_id, current_user)
+
+    async def event_stream():
+        last_version = None
+        while not await request.is_disconnected():
+            job = await import_job_registry.get(job_id)
+            if job is None:
+                break
+            if job.version != last_version:
+                last_version = job.version
+                yield f"event: progress\ndata: {json.dumps(job.to_dict(), default=str)}\n\n"
+            if job.state in FINISHED_STATES:
+                yield f"event: end\ndata: {json.dumps({'state': job.state})}\n\n"
+                break
+            await asyncio.sleep(settings.IMPORT_JOB_EVENTS_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 async def process_excel_import(
     task_id: str,
     excel_data: Dict,  # приймаємо вже оброблені дані
@@ -190,7 +316,7 @@ async def process_excel_import(
         transformed_data = excel_service.transform_data(
             excel_data['data'],
             column_mapping,
-            table_name
+            validator=schema_service.get_table_validator(table_name)
         )
         
         if not transformed_data:
@@ -318,25 +444,3 @@ def get_import_config(import_type: str):
 
     }
     return configs.get(import_type)
-
-async def import_brands_data(
-    task_id: str,
-    brands_data: List[Dict],
-    source_id: int,
-    user_id: int
-):
-    
-    try:
-        logger.info(f"Starting brands import task {task_id}")
-
-        # # Валідація
-        # validation_result = excel_service.validate_data(
-        #     brands_data,
-        #     table_schema,
-        #     column_mapping
-        # )
-
-        await Cat_ProductBrand.import_from_rows(brands_data['data'], source_id, user_id) 
-
-    except Exception as e:
-        logger.error(f"Error in brands import task {task_id}: {e}")
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 from datetime import datetime
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.core.server_setup import get_ssl_config
+from app.db.database import db_manager
 from app.services.database_service import DatabaseService
 
 router = APIRouter()
@@ -39,6 +41,24 @@ async def health_check_db():
             "error": str(e)
         }
 
+@router.get("/metrics")
+async def metrics_status():
+    """Метрики поточного процесу (лічильники та гістограми часу)"""
+    return {
+        "timestamp": datetime.utcnow(),
+        **metrics.snapshot()
+    }
+
+@router.get("/pool")
+async def pool_status():
+    """Стан пулу з'єднань БД: зайняті/вільні, очікування, тайм-аути, час запитів по методах"""
+    return {
+        "timestamp": datetime.utcnow(),
+        "pool": db_manager.pool_stats(),
+        "read_pool": db_manager.pool_stats(readonly=True),
+        **metrics.snapshot("db.")
+    }
+
 @router.get("/ssl")
 async def ssl_status():
     """Статус SSL конфігурації"""
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from typing import List, Dict
 from datetime import datetime
-from app.core.security import get_current_user, require_admin_role, hash_password
+from app.core.security import get_current_user, require_admin_role, hash_password_async, invalidate_user_cache
 from app.services.database_service import DatabaseService
+from app.services.table_import_schema_service import table_import_schema_service
 
 router = APIRouter()
 
@@ -74,28 +77,38 @@ async def create_user(
     """Створити користувача (тільки для адмінів)"""
     # require_admin_role(current_user)
 
+    # Обов'язковість, довжина і типи полів - з YAML схеми cat_users
+    try:
+        user = table_import_schema_service.get_table_validator("cat_users").validate_payload(
+            user_data, ["name", "full_name", "email", "is_admin"]
+        )
+    except ValidationError as e:
+        # Без input - тіло запиту містить пароль
+        errors = e.errors(include_url=False, include_input=False)
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in errors])
+
     # Перевірка унікальності name/full_name/email за потреби
 
-    password_hash = hash_password(user_data.get("password", ""))
+    password_hash = await hash_password_async(user_data.get("password", ""))
 
     query = """
     INSERT INTO cat_users (name, full_name, email, password_hash, is_active, is_admin, _created_at, _created_by)
     VALUES (?, ?, ?, ?, ?, ?, GETDATE(), ?)
     """
     params = (
-        user_data.get("name", ""),
-        user_data.get("full_name", ""),
-        user_data.get("email", ""),
+        user["name"],
+        user["full_name"],
+        user["email"],
         password_hash,
         True,
-        user_data.get("is_admin", False),
+        user["is_admin"],
         current_user["_id"]
     )
     await DatabaseService.execute_non_query(query, params)
 
-    # Отримати створеного користувача (наприклад, за name)
+    # Отримати створеного користувача (наприклад, за name) - з primary, репліка може відставати
     select_query = "SELECT _id, name, full_name, email FROM cat_users WHERE name = ?"
-    result = await DatabaseService.execute_query(select_query, (user_data.get("name", ""),))
+    result = await DatabaseService.execute_query(select_query, (user["name"],), readonly=False)
     if not result:
         raise HTTPException(status_code=500, detail="User creation failed")
     return result[0]
@@ -117,4 +130,5 @@ async def delete_user(
         )
     
     MOCK_USERS = [u for u in MOCK_USERS if u["id"] != user_id]
+    invalidate_user_cache(user_id)
     return {"message": f"User {user_id} deleted by {current_user['username']}"}
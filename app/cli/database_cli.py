@@ -2,6 +2,7 @@ import click
 import asyncio
 import sys
 import os
+import signal
 from pathlib import Path
 
 # Додаємо шлях до проєкту
@@ -20,10 +21,13 @@ import logging
 # Налаштування логування для CLI
 logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
 
-async def init_database():
+async def init_database(minsize: int = None, maxsize: int = None):
     """Ініціалізувати підключення до БД для CLI"""
     try:
-        await db_manager.create_pool()
+        if maxsize:
+            await db_manager.create_pool(minsize=min(minsize or 1, maxsize), maxsize=maxsize)
+        else:
+            await db_manager.create_pool()
         return True
     except Exception as e:
         click.echo(f"❌ Failed to connect to database: {e}")
@@ -44,7 +48,8 @@ def db():
 @db.command()
 @click.option('--dry-run', is_flag=True, help='Show what would be changed without executing')
 @click.option('--update-existing', is_flag=True, help='Update existing tables')
-def migrate(dry_run, update_existing):
+@click.option('--full', is_flag=True, help='Check all tables, ignoring stored schema fingerprints')
+def migrate(dry_run, update_existing, full):
     """Застосувати міграції"""
     
     async def run_migration():
@@ -56,7 +61,9 @@ def migrate(dry_run, update_existing):
             
             if update_existing:
                 # Оновити існуючі таблиці
-                results = await migration_service.update_existing_tables(dry_run=dry_run)
+                results = await migration_service.update_existing_tables(dry_run=dry_run, full=full)
+                if results["unchanged_tables"]:
+                    click.echo(f"⏭️  {len(results['unchanged_tables'])} tables unchanged since last migration")
                 
                 if dry_run:
                     click.echo("🔍 Planned changes:")
@@ -71,7 +78,7 @@ def migrate(dry_run, update_existing):
                             click.echo(f"   • {table}")
             else:
                 # Створити нові таблиці (існуючий код)
-                results = await migration_service.create_all_tables()
+                results = await migration_service.create_all_tables(full=full)
                 # ... існуючий код виводу ...
             
             if results["errors"]:
@@ -216,6 +223,9 @@ def show_table(table_name):
         
         click.echo(f"📋 Table: {table_name}")
         click.echo("=" * (len(table_name) + 8))
+        schema_info = schema_manager.get_schema_info_for_table(table_name)
+        if schema_info['file']:
+            click.echo(f"📄 Schema file: {schema_info['file']} (v{schema_info['version']})")
         
         # Columns
         columns = table_def.get('columns', {})
@@ -235,9 +245,10 @@ def show_table(table_name):
             click.echo(f"🔍 Indexes ({len(indexes)}):")
             for index in indexes:
                 unique = "[UNIQUE] " if index.get('unique') else ""
-                columns = ', '.join(index['columns'])
-                name = index.get('_name', 'auto-generated')
-                click.echo(f"   • {unique}{name} ({columns})")
+                columns = ', '.join(index.get('columns', []))
+                name = index.get('name', 'auto-generated')
+                auto = " [AUTO]" if index.get('auto') else ""
+                click.echo(f"   • {unique}{name} ({columns}){auto}")
         
         # SQL Preview
         sql = schema_manager.generate_create_table_sql(table_name, table_def)
@@ -458,6 +469,16 @@ def diff_table(table_name):
                 for col_name in differences['drop_columns']:
                     click.echo(f"   • {col_name}")
             
+            if differences['add_indexes']:
+                click.echo("\n🔍 Indexes to create:")
+                for index in differences['add_indexes']:
+                    click.echo(f"   • {index['name']} ({', '.join(index.get('columns', []))})")
+            
+            if differences['rebuild_indexes']:
+                click.echo("\n🔁 Indexes to rebuild:")
+                for index in differences['rebuild_indexes']:
+                    click.echo(f"   • {index['name']} ({', '.join(index.get('columns', []))})")
+            
             # SQL команди
             alter_commands = generator.generate_alter_commands(table_name, differences)
             click.echo("\n💾 SQL Commands:")
@@ -649,6 +670,40 @@ def sync_enumerations(dry_run):
     
     asyncio.run(run_sync())
 
+@db.command()
+@click.option('--concurrency', type=int, default=None, help='Import jobs executed at the same time')
+def import_worker(concurrency):
+    """Запустити воркер черги імпорту"""
+    from app.services.import_worker import ImportWorker
+
+    async def run_worker():
+        # Власний невеликий пул - воркер не забирає з'єднання у API
+        if not await init_database(minsize=1, maxsize=settings.IMPORT_WORKER_DB_POOL_SIZE):
+            return False
+
+        worker = ImportWorker(concurrency=concurrency)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except NotImplementedError:
+                # Windows - зупинка через KeyboardInterrupt
+                pass
+
+        click.echo(f"🚚 Import worker {worker.worker_id} started (concurrency {worker.concurrency})")
+        try:
+            await worker.run()
+            return True
+        finally:
+            await cleanup_database()
+            click.echo("🛑 Import worker stopped")
+
+    try:
+        success = asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        success = True
+    sys.exit(0 if success else 1)
+
 
 if __name__ == '__main__':
     db()
\ No newline at end of file
@@ -9,6 +9,18 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = "YourPassword123"
     DB_PORT: int = 1433
     DB_DRIVER: str = "ODBC Driver 17 for SQL Server"
+    DB_READ_SERVER: Optional[str] = None  # Сервер-репліка для читання (None - DB_SERVER)
+    DB_READ_PORT: Optional[int] = None  # Порт репліки (None - DB_PORT)
+    DB_READ_APPLICATION_INTENT: bool = False  # ApplicationIntent=ReadOnly (Always On направить на вторинну репліку)
+    DB_READ_MAX_CONNECTIONS: Optional[int] = None  # Бюджет з'єднань репліки на всі процеси (None - як DB_MAX_CONNECTIONS, а без DB_READ_SERVER - половина його)
+    DB_MAX_CONNECTIONS: int = 100  # Загальний бюджет з'єднань до SQL Server на всі процеси сервера
+    DB_POOL_MIN_SIZE: int = 5  # Бажаний мінімум пулу на процес (обмежується бюджетом)
+    DB_POOL_MAX_SIZE: int = 20  # Стеля пулу на процес (обмежується бюджетом)
+    DB_POOL_ACQUIRE_TIMEOUT: float = 30.0  # Максимальне очікування вільного з'єднання з пулу (сек)
+    DB_POOL_SLOW_ACQUIRE_SECONDS: float = 0.5  # Очікування з'єднання довше за це - warning у лог
+    DB_RETRY_ATTEMPTS: int = 3  # Спроб транзакції при deadlock/тайм-ауті блокування (розрив з'єднання - лише ідемпотентні)
+    DB_RETRY_BASE_DELAY: float = 0.1  # Базова пауза між спробами (сек), росте експоненційно з jitter
+    DB_RETRY_MAX_DELAY: float = 2.0  # Максимальна пауза між спробами (сек)
     
     # Connection string for MS SQL
     @property
@@ -19,10 +31,51 @@ class Settings(BaseSettings):
             f"?driver={self.DB_DRIVER.replace(' ', '+')}"
         )
     
+    # Окремий пул для читання, якщо задано сервер репліки або ApplicationIntent
+    @property
+    def DB_READ_ENABLED(self) -> bool:
+        return bool(self.DB_READ_SERVER) or self.DB_READ_APPLICATION_INTENT
+    
+    # Пул читання без окремого сервера і власного бюджету може потрапити на primary (ApplicationIntent
+    # без читабельної вторинної репліки) - тоді DB_MAX_CONNECTIONS ділиться між двома пулами
+    @property
+    def DB_READ_SHARES_BUDGET(self) -> bool:
+        read_server = self.DB_READ_SERVER or self.DB_SERVER
+        return self.DB_READ_ENABLED and self.DB_READ_MAX_CONNECTIONS is None and read_server == self.DB_SERVER
+    
+    @property
+    def _primary_budget(self) -> int:
+        budget = self.DB_MAX_CONNECTIONS
+        if self.IMPORT_USE_WORKER:
+            budget -= self.IMPORT_WORKER_DB_POOL_SIZE
+        return budget
+    
+    def _per_worker(self, budget: int) -> int:
+        return max(1, min(self.DB_POOL_MAX_SIZE, budget // (self.WORKERS or 1)))
+    
+    # Розмір пулу на процес: бюджет DB_MAX_CONNECTIONS ділиться між процесами сервера
+    @property
+    def DB_POOL_MAXSIZE_PER_WORKER(self) -> int:
+        budget = self._primary_budget
+        if self.DB_READ_SHARES_BUDGET:
+            budget -= budget // 2
+        return self._per_worker(budget)
+    
+    @property
+    def DB_READ_POOL_MAXSIZE_PER_WORKER(self) -> int:
+        if self.DB_READ_SHARES_BUDGET:
+            return self._per_worker(self._primary_budget // 2)
+        return self._per_worker(self.DB_READ_MAX_CONNECTIONS or self.DB_MAX_CONNECTIONS)
+    
+    @property
+    def DB_POOL_MINSIZE_PER_WORKER(self) -> int:
+        return min(self.DB_POOL_MIN_SIZE, self.DB_POOL_MAXSIZE_PER_WORKER)
+    
     # Server Configuration
     HOST: str = "127.0.0.1"
     PORT: int = 8000
     DEBUG: bool = True
+    WORKERS: Optional[int] = None  # Кількість процесів сервера (gunicorn.conf.py експортує автоматично)
     
     # SSL Configuration - ДОДАЙТЕ ЦІ ПОЛЯ
     USE_SSL: bool = False
@@ -45,6 +98,14 @@ class Settings(BaseSettings):
         JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 30  # 30 хвилин
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # Кеш автентифікованих користувачів (на процес; 0 - вимкнено)
+    USER_CACHE_TTL_SECONDS: float = 30.0  # Максимальна затримка застосування змін користувача (права, деактивація) в інших воркерах
+    USER_CACHE_MAX_SIZE: int = 1000
+
+    # Хешування паролів
+    BCRYPT_ROUNDS: int = 12  # Cost factor bcrypt (кожен +1 подвоює час хешування)
+    PASSWORD_HASH_WORKERS: int = 2  # Потоків для bcrypt (на кожен воркер сервера)
+
     # Trusted hosts для production
     TRUSTED_HOSTS: list = [
         "localhost", 
@@ -62,10 +123,34 @@ class Settings(BaseSettings):
     DB_SCHEMAS_DIR: str = "app/db/schemas"
     DB_ENUMERATIONS_DIR: str = "app/db/enumerations_schemas"
     DB_PLUGINS_DIR: str = "plugins"
+    DB_SCHEMA_CACHE_PATH: Optional[str] = "data/schema_cache.pickle"  # Компільований кеш YAML-схем (None - вимкнено)
 
     ENABLED_PLUGINS: list = []
     # ENABLED_PLUGINS: list = ["SalesAnalytics", "inventory", "billing", "reports"]
 
+    # Імпорт даних
+    IMPORT_CHUNK_SIZE: int = 5000  # Рядків в одній порції при потоковому читанні файлу
+    IMPORT_MAX_FILE_SIZE: int = 50 * 1024 * 1024  # Файл, що читається в пам'ять цілком (preview, .xls), байт
+    IMPORT_STREAM_MAX_FILE_SIZE: int = 500 * 1024 * 1024  # Файл імпорту, що читається порціями (.xlsx, .csv), байт
+    IMPORT_SPOOL_DIR: Optional[str] = "data/import_spool"  # Тека для файлів завантажень (спільна для API і воркера)
+    IMPORT_PARSER_WORKERS: int = 2  # Процесів для парсингу Excel/CSV (на кожен воркер сервера)
+    IMPORT_PARSER_MAX_QUEUE: int = 8  # Скільки запитів може чекати на парсер, далі - 429
+    IMPORT_PARSE_CACHE_DIR: Optional[str] = "data/import_parse_cache"  # Кеш розібраних файлів за SHA-256 (None - лише в пам'яті)
+    IMPORT_PARSE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # Розмір кешу на диску, далі - витіснення LRU
+    IMPORT_PARSE_CACHE_MEMORY_ROWS: int = 200_000  # Рядків розібраних файлів у пам'яті процесу (LRU)
+    IMPORT_PARSE_CACHE_MAX_ROWS: int = 100_000  # Більші файли не кешуються - імпорт читає їх потоково
+    IMPORT_PARSE_CACHE_TTL_SECONDS: float = 3600.0  # Запис кешу, не використаний довше, видаляється
+    IMPORT_JOB_EVENTS_INTERVAL: float = 1.0  # Період оновлення SSE-потоку прогресу імпорту, сек
+    IMPORT_QUEUE_PATH: str = "data/import_queue.db"  # SQLite-файл черги задач імпорту
+    IMPORT_USE_WORKER: bool = False  # True - задачі виконує окремий процес `python -m app.cli import-worker`
+    IMPORT_WORKER_CONCURRENCY: int = 2  # Скільки задач воркер виконує одночасно
+    IMPORT_WORKER_DB_POOL_SIZE: int = 5  # Розмір пулу з'єднань БД у процесі воркера
+    IMPORT_WORKER_POLL_INTERVAL: float = 1.0  # Період опитування черги, сек
+    IMPORT_WORKER_SHUTDOWN_TIMEOUT: float = 60.0  # Скільки чекати завершення задач при зупинці воркера, сек
+    IMPORT_JOB_HEARTBEAT_INTERVAL: float = 10.0  # Період heartbeat задач, що виконуються, сек
+    IMPORT_JOB_STALE_TIMEOUT: float = 120.0  # Без heartbeat довше - задача повертається в чергу
+    IMPORT_JOB_MAX_ATTEMPTS: int = 3  # Після стількох спроб задача вважається невдалою
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
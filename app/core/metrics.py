@@ -0,0 +1,74 @@
+# app/core/metrics.py
+from collections import deque
+from typing import Dict, Any
+import threading
+
+# Скільки останніх значень гістограми зберігати для перцентилів
+HISTOGRAM_WINDOW = 1024
+
+
+class Histogram:
+    """Count/sum/max over the process lifetime plus percentiles over a recent window"""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self._recent.append(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = sorted(self._recent)
+
+        def percentile(p: float) -> float:
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(p * len(recent)))]
+
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50": round(percentile(0.50), 6),
+            "p95": round(percentile(0.95), 6),
+            "p99": round(percentile(0.99), 6),
+            "max": round(self.max, 6),
+        }
+
+
+class MetricsRegistry:
+    """In-process counters and histograms (per worker)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+
+    def increment(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {name: value for name, value in self._counters.items() if name.startswith(prefix)},
+                "histograms": {
+                    name: histogram.snapshot()
+                    for name, histogram in self._histograms.items()
+                    if name.startswith(prefix)
+                },
+            }
+
+
+metrics = MetricsRegistry()
@@ -1,9 +1,14 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from app.core.config import settings
+from app.core.cache import TTLCache
+from app.core.metrics import metrics
 from app.services.database_service import DatabaseService
 
 # Використовуйте налаштування з config
@@ -13,6 +18,16 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
 
 security = HTTPBearer()
 
+# user_id -> поля cat_users для обробників (без password_hash); інвалідація локальна для процесу, між воркерами - по TTL
+user_cache = TTLCache(settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_SIZE)
+
+def invalidate_user_cache(user_id: Optional[int] = None):
+    """Скинути кеш користувача (або весь кеш) після змін в cat_users"""
+    if user_id is None:
+        user_cache.clear()
+    else:
+        user_cache.invalidate(user_id)
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None):
     """Створення JWT токену (заглушка)"""
     to_encode = data.copy()
@@ -57,7 +72,7 @@ def hash_password(password: str) -> str:
     """Захешувати пароль"""
     try:
         import bcrypt
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
         hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
         return hashed.decode('utf-8')
     except ImportError:
@@ -65,6 +80,45 @@ def hash_password(password: str) -> str:
         import hashlib
         return hashlib.sha256(password.encode()).hexdigest()
 
+# bcrypt навмисно повільний - виконуємо в окремих потоках, а не в event loop
+password_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_password_executor() -> ThreadPoolExecutor:
+    global password_executor
+    if password_executor is None:
+        password_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+        )
+    return password_executor
+
+async def _run_password_operation(name: str, func, *args):
+    submitted = time.perf_counter()
+
+    def timed():
+        started = time.perf_counter()
+        metrics.observe(f"password.{name}.queue_wait_seconds", started - submitted)
+        try:
+            return func(*args)
+        finally:
+            metrics.observe(f"password.{name}.seconds", time.perf_counter() - started)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_executor(), timed)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Перевірити пароль в пулі потоків"""
+    return await _run_password_operation("verify", verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    """Захешувати пароль в пулі потоків"""
+    return await _run_password_operation("hash", hash_password, password)
+
+def shutdown_password_executor():
+    global password_executor
+    if password_executor is not None:
+        password_executor.shutdown(wait=False, cancel_futures=True)
+        password_executor = None
+
 # Замінити authenticate_user на БД
 async def authenticate_user(user_id: int, password: str) -> Optional[Dict[str, Any]]:
     """Check user in database"""
@@ -77,7 +131,7 @@ async def authenticate_user(user_id: int, password: str) -> Optional[Dict[str, A
     if not users:
         return None
     user = users[0]
-    if verify_password(password, user["password_hash"]):
+    if await verify_password_async(password, user["password_hash"]):
         return {
             "_id": user["_id"],
             "name": user["name"],
@@ -94,11 +148,16 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     token = credentials.credentials
     payload = verify_token(token)
     user_id = payload.get("user_id")
-    query = "SELECT * FROM cat_users WHERE _id = ? AND is_active = 1"
-    users = await DatabaseService.execute_query(query, (user_id,))
-    if not users:
-        raise HTTPException(status_code=401, detail="User not found")
-    return users[0]
+    user = user_cache.get(user_id)
+    if user is None:
+        query = "SELECT _id, name, full_name, is_admin, is_active FROM cat_users WHERE _id = ? AND is_active = 1"
+        users = await DatabaseService.execute_query(query, (user_id,))
+        if not users:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = users[0]
+        user_cache.set(user_id, user)
+    # Копія - щоб зміни в обробнику не потрапили в кеш
+    return dict(user)
 
 def require_admin_role(current_user: Dict = None):
     """Перевірка ролі адміністратора"""
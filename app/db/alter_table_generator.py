@@ -1,4 +1,5 @@
 from typing import List, Dict, Tuple, Any
+from app.db.schema_manager import build_index_sql
 
 class AlterTableGenerator:
     """Генерація ALTER TABLE команд"""
@@ -7,6 +8,10 @@ class AlterTableGenerator:
         """Згенерувати команди ALTER TABLE"""
         commands = []
         
+        # Індекси, що перебудовуються, видаляємо першими - вони можуть блокувати зміну колонок
+        for index in differences.get('rebuild_indexes', []):
+            commands.append(f"DROP INDEX {index['name']} ON {table_name}")
+        
         # Додати колонки
         for col_name, col_def in differences.get('add_columns', []):
             cmd = self._generate_add_column(table_name, col_name, col_def)
@@ -22,6 +27,17 @@ class AlterTableGenerator:
             drop_commands = self._generate_drop_column(table_name, col_name)
             commands.extend(drop_commands)  # ← extend замість append
         
+        # PK стає NONCLUSTERED, якщо схема оголошує власний clustered індекс
+        for pk_name, pk_columns in differences.get('nonclustered_primary_key', []):
+            commands.append(f"ALTER TABLE {table_name} DROP CONSTRAINT {pk_name}")
+            commands.append(
+                f"ALTER TABLE {table_name} ADD CONSTRAINT {pk_name} PRIMARY KEY NONCLUSTERED ({', '.join(pk_columns)})"
+            )
+        
+        # Створити відсутні та перебудовані індекси (після нових колонок)
+        for index in differences.get('add_indexes', []) + differences.get('rebuild_indexes', []):
+            commands.append(build_index_sql(table_name, index))
+        
         return commands
     
     def _generate_add_column(self, table_name: str, col_name: str, col_def: Dict) -> str:
@@ -1,59 +1,340 @@
 import aioodbc
+import asyncio
 import logging
-from typing import Optional, List, Dict, Any
-from contextlib import asynccontextmanager
+import time
+import weakref
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any, Awaitable, Callable
+from contextlib import asynccontextmanager, suppress
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.retry import RetryPolicy, is_connection_error, transient_error_code
 
 logger = logging.getLogger(__name__)
 
+# Активний UnitOfWork поточної задачі
+current_unit_of_work: ContextVar[Optional["UnitOfWork"]] = ContextVar("current_unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """Одна транзакція (на одному з'єднанні з пулу) на всі виклики БД в межах області.
+
+    З'єднання береться з пулу при першому використанні і утримується до кінця області.
+    Його використовує лише задача, що відкрила область; задачі, створені всередині, працюють через пул.
+    """
+
+    def __init__(self, manager: "DatabaseManager"):
+        self.manager = manager
+        self.parent: Optional[UnitOfWork] = None
+        self.owner: Optional[asyncio.Task] = None
+        self.failed = False
+        self.closed = False
+        self._connection = None
+        self._own_connection = False
+        self._token = None
+
+    @property
+    def usable(self) -> bool:
+        return not self.closed and asyncio.current_task() is self.owner
+
+    @property
+    def owns_transaction(self) -> bool:
+        """Цей UnitOfWork фіксує транзакцію (а не приєднується до зовнішньої)"""
+        return self.parent is None
+
+    async def connection(self):
+        """З'єднання транзакції; читання в ній теж йдуть на primary - щоб бачити власні зміни"""
+        if self._connection is None:
+            if self.parent is not None:
+                # Вкладений UnitOfWork працює на з'єднанні зовнішнього
+                self._connection = await self.parent.connection()
+            else:
+                self._connection = await self.manager.acquire()
+                self._own_connection = True
+        return self._connection
+
+    async def discard_connection(self, conn):
+        """Розірване з'єднання: закрити, не повертати в пул, наступний виклик візьме нове"""
+        if self._connection is not conn:
+            return
+        self._connection = None
+        if self._own_connection:
+            self._own_connection = False
+            await self.manager.discard(conn)
+        elif self.parent is not None:
+            await self.parent.discard_connection(conn)
+
+    async def __aenter__(self) -> "UnitOfWork":
+        parent = current_unit_of_work.get()
+        self.parent = parent if parent is not None and parent.usable else None
+        self.owner = asyncio.current_task()
+        self._token = current_unit_of_work.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        current_unit_of_work.reset(self._token)
+        await self.close(commit=exc_type is None)
+
+    async def close(self, commit: bool = True):
+        """Зафіксувати/відкотити транзакцію і повернути з'єднання в пул"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.parent is not None:
+            # Помилка у вкладеному блоці відкочує всю зовнішню транзакцію
+            if self.failed or not commit:
+                self.parent.failed = True
+        conn, self._connection = self._connection, None
+        if conn is None:
+            return
+        try:
+            if self.owns_transaction and commit and not self.failed:
+                await conn.commit()
+            elif self.owns_transaction:
+                await conn.rollback()
+        finally:
+            if self._own_connection:
+                self._own_connection = False
+                await self.manager.release(conn)
+
+
 class DatabaseManager:
     def __init__(self):
         self.pool: Optional[aioodbc.Pool] = None
-        
-    async def create_pool(self):
+        self.read_pool: Optional[aioodbc.Pool] = None  # Репліка для читання (DB_READ_*), якщо налаштована
+        self._waiting = {"db.pool": 0, "db.read_pool": 0}
+        # З'єднання -> пул / час першої видачі / поточної видачі (для віку і часу утримання)
+        self._connection_pool: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+        self._connection_born: "weakref.WeakKeyDictionary[Any, float]" = weakref.WeakKeyDictionary()
+        self._connection_acquired: "weakref.WeakKeyDictionary[Any, float]" = weakref.WeakKeyDictionary()
+    
+    def _build_dsn(self, server: str, port: int, read_only: bool = False) -> str:
         dsn = (
             f"DRIVER={{{settings.DB_DRIVER}}};"
-            f"SERVER={settings.DB_SERVER},{settings.DB_PORT};"
+            f"SERVER={server},{port};"
             f"DATABASE={settings.DB_DATABASE};"
             f"UID={settings.DB_USERNAME};"
             f"PWD={settings.DB_PASSWORD};"
             f"TrustServerCertificate=yes;"
             f"Encrypt=yes;"
         )
+        if read_only and settings.DB_READ_APPLICATION_INTENT:
+            dsn += "ApplicationIntent=ReadOnly;"
+        return dsn
+        
+    async def create_pool(self, minsize: int = None, maxsize: int = None):
+        """Пул з'єднань; за замовчуванням - частка DB_MAX_CONNECTIONS на цей процес"""
+        if maxsize is None:
+            maxsize = settings.DB_POOL_MAXSIZE_PER_WORKER
+        if minsize is None:
+            minsize = min(settings.DB_POOL_MINSIZE_PER_WORKER, maxsize)
+        workers = settings.WORKERS or 1
+        if settings.DB_MAX_CONNECTIONS < workers:
+            logger.warning(
+                f"DB_MAX_CONNECTIONS={settings.DB_MAX_CONNECTIONS} is less than {workers} workers; "
+                f"each worker still opens 1 connection"
+            )
         
         self.pool = await aioodbc.create_pool(
-            dsn=dsn,
-            minsize=5,
-            maxsize=20,
+            dsn=self._build_dsn(settings.DB_SERVER, settings.DB_PORT),
+            minsize=minsize,
+            maxsize=maxsize,
+            echo=settings.DEBUG,
+            autocommit=False,
+            timeout=30
+        )
+        logger.info(f"Database pool created (min {minsize}, max {maxsize})")
+    
+    async def create_read_pool(self, minsize: int = None, maxsize: int = None):
+        """Пул для читання з репліки (лише якщо задано DB_READ_SERVER або DB_READ_APPLICATION_INTENT).
+
+        За замовчуванням - частка DB_READ_MAX_CONNECTIONS. Без неї і без DB_READ_SERVER пул читання
+        бере половину DB_MAX_CONNECTIONS (друга половина - основному пулу): з'єднання можуть потрапити на primary.
+        """
+        if not settings.DB_READ_ENABLED:
+            return
+        if maxsize is None:
+            maxsize = settings.DB_READ_POOL_MAXSIZE_PER_WORKER
+        if minsize is None:
+            minsize = min(settings.DB_POOL_MINSIZE_PER_WORKER, maxsize)
+        
+        server = settings.DB_READ_SERVER or settings.DB_SERVER
+        self.read_pool = await aioodbc.create_pool(
+            dsn=self._build_dsn(server, settings.DB_READ_PORT or settings.DB_PORT, read_only=True),
+            minsize=minsize,
+            maxsize=maxsize,
             echo=settings.DEBUG,
             autocommit=False,
             timeout=30
         )
-        logger.info("Database pool created")
+        logger.info(f"Read-only database pool created ({server}, min {minsize}, max {maxsize})")
     
     async def close_pool(self):
-        if self.pool:
-            self.pool.close()
-            await self.pool.wait_closed()
+        for pool in (self.pool, self.read_pool):
+            if pool:
+                pool.close()
+                await pool.wait_closed()
+        self.read_pool = None
+    
+    async def acquire(self, readonly: bool = False):
+        """Взяти з'єднання з пулу з метриками очікування (db.pool.* / db.read_pool.*)"""
+        name = "db.read_pool" if readonly and self.read_pool is not None else "db.pool"
+        pool = self.read_pool if name == "db.read_pool" else self.pool
+        self._waiting[name] += 1
+        started = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), timeout=settings.DB_POOL_ACQUIRE_TIMEOUT)
+        except asyncio.TimeoutError:
+            metrics.increment(f"{name}.acquire_timeouts")
+            logger.error(
+                f"DB pool acquire timed out after {settings.DB_POOL_ACQUIRE_TIMEOUT}s: "
+                f"{self.pool_stats(readonly=name == 'db.read_pool')}"
+            )
+            raise
+        finally:
+            self._waiting[name] -= 1
+        
+        now = time.perf_counter()
+        wait = now - started
+        metrics.observe(f"{name}.acquire_wait_seconds", wait)
+        if wait >= settings.DB_POOL_SLOW_ACQUIRE_SECONDS:
+            metrics.increment(f"{name}.slow_acquires")
+            logger.warning(f"Slow DB pool acquire: {wait:.3f}s, {self.pool_stats(readonly=name == 'db.read_pool')}")
+        self._connection_pool[conn] = name
+        self._connection_born.setdefault(conn, now)
+        self._connection_acquired[conn] = now
+        return conn
+    
+    async def release(self, conn):
+        """Повернути з'єднання в його пул (час утримання - <pool>.hold_seconds)"""
+        name = self._connection_pool.get(conn, "db.pool")
+        acquired = self._connection_acquired.pop(conn, None)
+        if acquired is not None:
+            metrics.observe(f"{name}.hold_seconds", time.perf_counter() - acquired)
+        pool = self.read_pool if name == "db.read_pool" else self.pool
+        await pool.release(conn)
+    
+    async def discard(self, conn):
+        """Закрити розірване з'єднання і прибрати його з пулу"""
+        with suppress(Exception):
+            await conn.close()
+        await self.release(conn)
+    
+    def pool_stats(self, readonly: bool = False) -> Dict[str, Any]:
+        """Поточний стан пулу: розмір, зайняті/вільні з'єднання, черга, вік з'єднань"""
+        name = "db.read_pool" if readonly else "db.pool"
+        pool = self.read_pool if readonly else self.pool
+        if pool is None:
+            return {"status": "not_initialized"}
+        now = time.perf_counter()
+        ages = [
+            now - born for conn, born in list(self._connection_born.items())
+            if self._connection_pool.get(conn) == name
+        ]
+        return {
+            "minsize": pool.minsize,
+            "maxsize": pool.maxsize,
+            "size": pool.size,
+            "in_use": pool.size - pool.freesize,
+            "idle": pool.freesize,
+            "waiting": self._waiting[name],
+            "connection_age_seconds": {
+                "max": round(max(ages), 3) if ages else 0.0,
+                "avg": round(sum(ages) / len(ages), 3) if ages else 0.0,
+            },
+        }
+    
+    def unit_of_work(self) -> UnitOfWork:
+        """Одна транзакція для всіх викликів в межах async with"""
+        return UnitOfWork(self)
+    
+    def _active_unit_of_work(self) -> Optional[UnitOfWork]:
+        """Активний UnitOfWork поточної задачі"""
+        uow = current_unit_of_work.get()
+        return uow if uow is not None and uow.usable else None
     
     @asynccontextmanager
-    async def get_connection(self):
-        async with self.pool.acquire() as conn:
+    async def get_connection(self, shared: bool = True, readonly: bool = False):
+        """З'єднання з пулу або з активної транзакції UnitOfWork (shared=False - завжди окреме).
+
+        readonly=True - з пулу репліки, якщо вона налаштована і немає відкритої транзакції.
+        """
+        uow = self._active_unit_of_work() if shared else None
+        if uow is not None:
+            conn = await uow.connection()
             try:
                 yield conn
             except Exception as e:
-                await conn.rollback()
+                uow.failed = True
+                if is_connection_error(e):
+                    await uow.discard_connection(conn)
                 raise
+            return
+        
+        conn = await self.acquire(readonly)
+        try:
+            yield conn
+        except Exception as e:
+            if is_connection_error(e):
+                await self.discard(conn)
+                conn = None
+            else:
+                await conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                await self.release(conn)
     
     @asynccontextmanager
     async def get_transaction(self):
         async with self.get_connection() as conn:
+            uow = self._active_unit_of_work()
+            # В UnitOfWork фіксація - при виході з нього
+            deferred_commit = uow is not None
             async with conn.cursor() as cursor:
                 try:
                     yield cursor
-                    await conn.commit()
-                except Exception:
-                    await conn.rollback()
+                    if not deferred_commit:
+                        await conn.commit()
+                except Exception as e:
+                    if not deferred_commit and not is_connection_error(e):
+                        await conn.rollback()
+                    raise
+    
+    async def run_in_transaction(self, work: Callable[[Any], Awaitable[Any]], retry: Optional[RetryPolicy] = None,
+                                 idempotent: bool = False):
+        """Виконати work(cursor) в транзакції з повтором при deadlock/тайм-ауті блокування.
+
+        Кожна спроба - нова транзакція з початку. Після розриву з'єднання невідомо, чи
+        зафіксовано транзакцію, тому тоді повтор лише з idempotent=True (повторне виконання
+        work не змінює результат). В UnitOfWork повтору немає:
+        відкочується вся зовнішня транзакція.
+        """
+        if self._active_unit_of_work() is not None:
+            async with self.get_transaction() as cursor:
+                return await work(cursor)
+        
+        policy = retry or RetryPolicy.from_settings()
+        attempt = 1
+        while True:
+            try:
+                async with self.get_transaction() as cursor:
+                    result = await work(cursor)
+                if attempt > 1:
+                    metrics.increment("db.retry.recovered")
+                return result
+            except Exception as e:
+                code = transient_error_code(e)
+                if code is None or (not idempotent and is_connection_error(e)):
+                    raise
+                if attempt >= policy.attempts:
+                    metrics.increment("db.retry.exhausted")
                     raise
+                delay = policy.delay(attempt)
+                metrics.increment("db.retry.attempts")
+                metrics.increment(f"db.retry.error.{code}")
+                logger.warning(f"Transient DB error {code} (attempt {attempt}/{policy.attempts}), retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
 
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -1,4 +1,5 @@
 import logging
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 from app.db.schema_manager import SchemaManager
 from app.services.database_service import DatabaseService
@@ -13,7 +14,7 @@ class MigrationService:
     def __init__(self):
         self.schema_manager = SchemaManager()
         
-    async def create_all_tables(self) -> Dict[str, Any]:
+    async def create_all_tables(self, full: bool = False) -> Dict[str, Any]:
         """Створити всі таблиці і зареєструвати їх в sys_data_types"""
         results = {
             "created_tables": [],
@@ -28,15 +29,18 @@ class MigrationService:
             # Отримуємо порядок створення таблиць
             creation_order = self.schema_manager.get_table_creation_order()
             resolved_tables = self.schema_manager.get_all_tables()
+            fingerprints = self.schema_manager.get_table_fingerprints()
+            stored_fingerprints = {} if full else await self._get_stored_fingerprints()
             
             # Виконуємо в одній транзакції
             async with DatabaseService.get_transaction() as cursor:
                 for table_name in creation_order:
                     try:
-                        # Перевіряємо чи таблиця вже існує
+                        # Перевіряємо чи таблиця вже існує (відбиток не гарантує цього - таблицю могли видалити)
                         exists = await self._table_exists_in_transaction(cursor, table_name)
                         if exists:
-                            results["skipped_tables"].append(f"{table_name} (already exists)")
+                            unchanged = stored_fingerprints.get(table_name) == fingerprints[table_name]
+                            results["skipped_tables"].append(f"{table_name} ({'unchanged' if unchanged else 'already exists'})")
                             continue
                         
                         # Генеруємо SQL
@@ -66,13 +70,11 @@ class MigrationService:
             
             logger.info("All tables created successfully in transaction")
             
-            # Після створення кожної таблиці
-            for table_name in results["created_tables"]:  # Тільки створені таблиці!
-                try:
-                    schema_info = self.schema_manager.get_schema_info_for_table(table_name)
-                    await self._register_table_in_data_types(table_name, resolved_tables[table_name], schema_info)
-                except Exception as e:
-                    logger.warning(f"Could not register table {table_name} in sys_data_types: {e}")
+            # Після створення - зареєструвати всі створені таблиці одним пакетом
+            await self._register_tables_in_data_types(results["created_tables"], resolved_tables)
+            
+            # Запам'ятати відбитки створених таблиць
+            await self._save_fingerprints({table: fingerprints[table] for table in results["created_tables"]})
             
             # Після транзакції створення, але перед реєстрацією:
             if 'sys_data_types' not in results["created_tables"] and 'sys_data_types' not in results["skipped_tables"]:
@@ -150,11 +152,12 @@ class MigrationService:
         
         return info
     
-    async def update_existing_tables(self, dry_run: bool = False) -> Dict[str, Any]:
-        """Оновити існуючі таблиці згідно схеми"""
+    async def update_existing_tables(self, dry_run: bool = False, full: bool = False) -> Dict[str, Any]:
+        """Оновити існуючі таблиці згідно схеми (full=False - лише таблиці зі зміненим відбитком)"""
         results = {
             "updated_tables": [],
             "changes_planned": [],
+            "unchanged_tables": [],
             "errors": []
         }
         
@@ -162,18 +165,30 @@ class MigrationService:
             self.schema_manager.load_all_schemas()
             resolved_tables = self.schema_manager.get_all_tables()
             
+            fingerprints = self.schema_manager.get_table_fingerprints()
+            stored_fingerprints = {} if full else await self._get_stored_fingerprints()
+            changed_tables = {
+                table_name: yaml_structure for table_name, yaml_structure in resolved_tables.items()
+                if stored_fingerprints.get(table_name) != fingerprints[table_name]
+            }
+            results["unchanged_tables"] = [table for table in resolved_tables if table not in changed_tables]
+            if not changed_tables:
+                return results
+            
             comparator = SchemaComparator()
             generator = AlterTableGenerator()
             
-            for table_name, yaml_structure in resolved_tables.items():
+            # Структура всіх таблиць БД одним пакетом, порівняння - в пам'яті
+            db_structures = await comparator.get_all_table_structures()
+            applied_fingerprints = {}
+            
+            for table_name, yaml_structure in changed_tables.items():
                 try:
                     # Перевірити чи таблиця існує
-                    if not await self._table_exists(table_name):
+                    db_structure = db_structures.get(table_name.lower())
+                    if db_structure is None:
                         continue
                     
-                    # Отримати структуру з БД
-                    db_structure = await comparator.get_table_structure(table_name)
-                    
                     # Порівняти структури
                     differences = comparator.compare_table_structures(db_structure, yaml_structure)
                     
@@ -195,11 +210,17 @@ class MigrationService:
                                 logger.info(f"Executed: {cmd}")
                             
                             results["updated_tables"].append(table_name)
+                    
+                    # Таблиця відповідає схемі (або щойно оновлена)
+                    applied_fingerprints[table_name] = fingerprints[table_name]
                 
                 except Exception as e:
                     error_msg = f"Failed to update table {table_name}: {str(e)}"
                     logger.error(error_msg)
                     results["errors"].append(error_msg)
+            
+            if not dry_run:
+                await self._save_fingerprints(applied_fingerprints)
         
         except Exception as e:
             logger.error(f"Update tables failed: {e}")
@@ -207,26 +228,64 @@ class MigrationService:
         
         return results
     
-    async def _register_table_in_data_types(self, table_name: str, table_def: dict, schema_info: dict):
-        """Register table in sys_data_types after creation"""
+    async def _get_stored_fingerprints(self) -> Dict[str, str]:
+        """Відбитки таблиць, записані останньою міграцією"""
+        try:
+            rows = await DatabaseService.execute_query("SELECT table_name, fingerprint FROM sys_schema_state")
+            return {row['table_name']: row['fingerprint'] for row in rows}
+        except Exception as e:
+            # sys_schema_state ще не створена - перевіряємо всі таблиці
+            logger.debug(f"Table sys_schema_state might not exist yet: {e}")
+            return {}
+    
+    async def _save_fingerprints(self, fingerprints: Dict[str, str]):
+        """Записати відбитки застосованих таблиць"""
+        if not fingerprints:
+            return
+        try:
+            stored = await self._get_stored_fingerprints()
+            async with DatabaseService.get_transaction() as cursor:
+                await DatabaseService.bulk_update(
+                    "sys_schema_state",
+                    ["fingerprint", "updated_at"],
+                    [(fingerprint, datetime.now(), table) for table, fingerprint in fingerprints.items() if table in stored],
+                    key_column="table_name",
+                    cursor=cursor
+                )
+                await DatabaseService.bulk_insert(
+                    "sys_schema_state",
+                    ["table_name", "fingerprint"],
+                    [(table, fingerprint) for table, fingerprint in fingerprints.items() if table not in stored],
+                    identity_column=None,
+                    cursor=cursor
+                )
+        except Exception as e:
+            logger.warning(f"Failed to save schema fingerprints: {e}")
+    
+    async def _register_tables_in_data_types(self, table_names: List[str], resolved_tables: dict):
+        """Register created tables in sys_data_types"""
         
         # Check if registration is needed
-        if not self._should_register_table(table_name):
+        table_names = [name for name in table_names if self._should_register_table(name)]
+        if not table_names:
             return
         
         # Check if already registered
-        if await self._is_table_registered(table_name):
-            return
-        
-        # Extract type_name from table description (NEW LOCATION)
-        table_description = table_def.get('description', '')  # ← Змінити тут
-        type_name = self._extract_type_name_from_description(table_description)
+        registered = await self._get_registered_tables()
         
-        # Determine supports_mapping
-        supports_mapping = self._table_supports_mapping(table_name)
+        rows = []
+        for table_name in table_names:
+            if table_name in registered:
+                continue
+            # Extract type_name from table description (NEW LOCATION)
+            table_description = resolved_tables[table_name].get('description', '')
+            type_name = self._extract_type_name_from_description(table_description)
+            # Determine supports_mapping
+            supports_mapping = self._table_supports_mapping(table_name)
+            rows.append((type_name, table_name, True, supports_mapping))
         
-        # Insert record
-        await self._insert_data_type_record(table_name, type_name, supports_mapping)
+        # Insert records
+        await self._insert_data_type_records(rows)
     
     def _should_register_table(self, table_name: str) -> bool:
         """Визначити чи потрібно реєструвати таблицю"""
@@ -267,16 +326,15 @@ class MigrationService:
         # Обмежити довжину
         return type_name[:100] if type_name else "Unknown Type"
     
-    async def _is_table_registered(self, table_name: str) -> bool:
-        """Check if table is already registered in sys_data_types"""
+    async def _get_registered_tables(self) -> set:
+        """Table names already registered in sys_data_types"""
         try:
-            query = "SELECT COUNT(*) FROM sys_data_types WHERE table_name = ?"
-            result = await DatabaseService.execute_scalar(query, (table_name,))
-            return result > 0
+            rows = await DatabaseService.execute_query("SELECT table_name FROM sys_data_types")
+            return {row['table_name'] for row in rows}
         except Exception as e:
             # If sys_data_types table doesn't exist yet, consider as not registered
             logger.debug(f"Table sys_data_types might not exist yet: {e}")
-            return False
+            return set()
     
     def _table_supports_mapping(self, table_name: str) -> bool:
         """Determine if table supports external mapping"""
@@ -297,17 +355,21 @@ class MigrationService:
         
         return False
     
-    async def _insert_data_type_record(self, table_name: str, type_name: str, supports_mapping: bool):
-        """Insert record into sys_data_types"""
+    async def _insert_data_type_records(self, rows: List[tuple]):
+        """Insert records into sys_data_types"""
+        if not rows:
+            return
         try:
-            query = """
-            INSERT INTO sys_data_types (type_name, table_name, is_active, supports_mapping, created_at)
-            VALUES (?, ?, 1, ?, GETDATE())
-            """
-            await DatabaseService.execute_non_query(query, (type_name, table_name, supports_mapping))
-            logger.info(f"Registered table {table_name} as '{type_name}' in sys_data_types")
+            await DatabaseService.bulk_insert(
+                "sys_data_types",
+                ["type_name", "table_name", "is_active", "supports_mapping"],
+                rows,
+                identity_column=None
+            )
+            for type_name, table_name, _, _ in rows:
+                logger.info(f"Registered table {table_name} as '{type_name}' in sys_data_types")
         except Exception as e:
-            logger.warning(f"Failed to register table {table_name} in sys_data_types: {e}")
+            logger.warning(f"Failed to register tables in sys_data_types: {e}")
         
         # # Замінити перевірку на:
         # try:
@@ -0,0 +1,76 @@
+import random
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.core.config import settings
+
+# SQLSTATE: 40001 - deadlock victim, HYT00 - тайм-аут запиту, 08S01/08S02 - розрив з'єднання
+TRANSIENT_SQLSTATES = {"40001", "HYT00", "08S01", "08S02"}
+CONNECTION_SQLSTATES = {"08S01", "08S02"}
+# Номери помилок SQL Server: 1205 - deadlock, 1222 - тайм-аут блокування
+TRANSIENT_ERROR_NUMBERS = {"1205", "1222"}
+
+# Записи діагностики pyodbc розділені "; [SQLSTATE]", номер помилки - в дужках в кінці запису,
+# після нього може стояти функція ODBC (у першого запису або в кінці всього повідомлення):
+# "[HY000] ...[SQL Server]Lock request time out period exceeded. (1222) (SQLExecDirectW); [01000] ...terminated. (3621)"
+# Числа в дужках всередині тексту (значення з даних) не враховуються
+_RECORD_SEPARATOR_RE = re.compile(r"; (?=\[[0-9A-Z]{5}\])")
+_NATIVE_ERROR_RE = re.compile(r"\((\d+)\)(?: \(SQL\w+\))?$")
+
+
+def _sqlstate(exc: BaseException) -> Optional[str]:
+    """pyodbc.Error: args[0] - SQLSTATE, args[1] - повідомлення з номером помилки в дужках"""
+    if exc.args and isinstance(exc.args[0], str) and len(exc.args[0]) == 5:
+        return exc.args[0]
+    return None
+
+
+def native_error_numbers(exc: BaseException) -> List[str]:
+    """Номери помилок SQL Server з записів діагностики pyodbc"""
+    if len(exc.args) < 2 or not isinstance(exc.args[1], str):
+        return []
+    numbers = []
+    for record in _RECORD_SEPARATOR_RE.split(exc.args[1]):
+        match = _NATIVE_ERROR_RE.search(record.rstrip())
+        if match:
+            numbers.append(match.group(1))
+    return numbers
+
+
+def transient_error_code(exc: BaseException) -> Optional[str]:
+    """Код тимчасової помилки (номер SQL Server або SQLSTATE), None - помилка не тимчасова"""
+    for number in native_error_numbers(exc):
+        if number in TRANSIENT_ERROR_NUMBERS:
+            return number
+    sqlstate = _sqlstate(exc)
+    return sqlstate if sqlstate in TRANSIENT_SQLSTATES else None
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    return transient_error_code(exc) is not None
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """З'єднання розірване - його не можна повертати в пул"""
+    return _sqlstate(exc) in CONNECTION_SQLSTATES
+
+
+@dataclass
+class RetryPolicy:
+    """Повтор транзакції при deadlock/тайм-ауті/розриві з'єднання з експоненційним backoff і jitter"""
+    attempts: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 2.0
+
+    @classmethod
+    def from_settings(cls) -> "RetryPolicy":
+        return cls(
+            attempts=settings.DB_RETRY_ATTEMPTS,
+            base_delay=settings.DB_RETRY_BASE_DELAY,
+            max_delay=settings.DB_RETRY_MAX_DELAY,
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Пауза перед повтором після attempt-ї невдалої спроби (full jitter)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
@@ -1,57 +1,117 @@
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional
 import logging
+import re
 from app.services.database_service import DatabaseService
+from app.db.schema_manager import has_clustered_index
 
 logger = logging.getLogger(__name__)
 
 class SchemaComparator:
     """Порівняння схеми БД з YAML описом"""
     
+    # Колонки всіх таблиць одним запитом через системні каталоги (без INFORMATION_SCHEMA)
+    COLUMNS_QUERY = """
+    SELECT
+        t.name AS TABLE_NAME,
+        c.name AS COLUMN_NAME,
+        TYPE_NAME(c.system_type_id) AS DATA_TYPE,
+        c.is_nullable AS IS_NULLABLE,
+        dc.definition AS COLUMN_DEFAULT,
+        CASE
+            WHEN c.max_length = -1 THEN -1
+            WHEN TYPE_NAME(c.system_type_id) IN ('nvarchar', 'nchar') THEN c.max_length / 2
+            ELSE c.max_length
+        END AS CHARACTER_MAXIMUM_LENGTH,
+        c.precision AS NUMERIC_PRECISION,
+        c.scale AS NUMERIC_SCALE,
+        CASE WHEN pk.column_id IS NOT NULL THEN 1 ELSE 0 END AS IS_PRIMARY_KEY,
+        CASE WHEN fk.parent_column_id IS NOT NULL THEN 1 ELSE 0 END AS IS_FOREIGN_KEY
+    FROM sys.tables t
+    JOIN sys.columns c ON c.object_id = t.object_id
+    LEFT JOIN sys.default_constraints dc ON dc.object_id = c.default_object_id
+    LEFT JOIN (
+        SELECT DISTINCT ic.object_id, ic.column_id
+        FROM sys.indexes i
+        JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+        WHERE i.is_primary_key = 1
+    ) pk ON pk.object_id = c.object_id AND pk.column_id = c.column_id
+    LEFT JOIN (
+        SELECT DISTINCT parent_object_id, parent_column_id
+        FROM sys.foreign_key_columns
+    ) fk ON fk.parent_object_id = c.object_id AND fk.parent_column_id = c.column_id
+    WHERE t.is_ms_shipped = 0 AND (? IS NULL OR t.name = ?)
+    ORDER BY t.name, c.column_id
+    """
+
+    INDEXES_QUERY = """
+    SELECT
+        t.name AS TABLE_NAME,
+        i.name AS INDEX_NAME,
+        i.type_desc AS INDEX_TYPE,
+        i.is_unique AS IS_UNIQUE,
+        i.is_primary_key AS IS_PRIMARY_KEY,
+        i.filter_definition AS FILTER_DEFINITION,
+        i.fill_factor AS FILL_FACTOR,
+        p.data_compression_desc AS DATA_COMPRESSION,
+        c.name AS COLUMN_NAME,
+        ic.is_included_column AS IS_INCLUDED_COLUMN
+    FROM sys.indexes i
+    JOIN sys.tables t ON t.object_id = i.object_id
+    JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    OUTER APPLY (
+        SELECT TOP 1 data_compression_desc
+        FROM sys.partitions
+        WHERE object_id = i.object_id AND index_id = i.index_id
+        ORDER BY partition_number
+    ) p
+    WHERE t.is_ms_shipped = 0 AND i.name IS NOT NULL AND (? IS NULL OR t.name = ?)
+    ORDER BY t.name, i.name, ic.key_ordinal, ic.index_column_id
+    """
+
     async def get_table_structure(self, table_name: str) -> Dict[str, Any]:
         """Отримати структуру таблиці з БД"""
-        query = """
-        SELECT 
-            c.COLUMN_NAME,
-            c.DATA_TYPE,
-            c.IS_NULLABLE,
-            c.COLUMN_DEFAULT,
-            c.CHARACTER_MAXIMUM_LENGTH,
-            c.NUMERIC_PRECISION,
-            c.NUMERIC_SCALE,
-            CASE WHEN pk.COLUMN_NAME IS NOT NULL THEN 1 ELSE 0 END as IS_PRIMARY_KEY,
-            CASE WHEN fk.COLUMN_NAME IS NOT NULL THEN 1 ELSE 0 END as IS_FOREIGN_KEY
-        FROM INFORMATION_SCHEMA.COLUMNS c
-        LEFT JOIN (
-            SELECT ku.COLUMN_NAME, ku.TABLE_NAME
-            FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
-            JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE ku ON tc.CONSTRAINT_NAME = ku.CONSTRAINT_NAME
-            WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
-        ) pk ON c.COLUMN_NAME = pk.COLUMN_NAME AND c.TABLE_NAME = pk.TABLE_NAME
-        LEFT JOIN (
-            SELECT ku.COLUMN_NAME, ku.TABLE_NAME
-            FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
-            JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE ku ON tc.CONSTRAINT_NAME = ku.CONSTRAINT_NAME
-            WHERE tc.CONSTRAINT_TYPE = 'FOREIGN KEY'
-        ) fk ON c.COLUMN_NAME = fk.COLUMN_NAME AND c.TABLE_NAME = fk.TABLE_NAME
-        WHERE c.TABLE_NAME = ?
-        ORDER BY c.ORDINAL_POSITION
-        """
-        
-        result = await DatabaseService.execute_query(query, (table_name,))
-        
-        columns = {}
-        for row in result:
+        structures = await self._load_table_structures(table_name)
+        return structures.get(table_name.lower(), {'columns': {}, 'indexes': {}})
+
+    async def get_all_table_structures(self) -> Dict[str, Dict[str, Any]]:
+        """Отримати структури всіх таблиць БД двома запитами (ключ - назва таблиці в нижньому регістрі)"""
+        return await self._load_table_structures()
+
+    async def _load_table_structures(self, table_name: str = None) -> Dict[str, Dict[str, Any]]:
+        params = (table_name, table_name)
+        column_rows = await DatabaseService.execute_query(self.COLUMNS_QUERY, params)
+        index_rows = await DatabaseService.execute_query(self.INDEXES_QUERY, params)
+
+        structures: Dict[str, Dict[str, Any]] = {}
+        for row in column_rows:
+            table = structures.setdefault(row['TABLE_NAME'].lower(), {'columns': {}, 'indexes': {}})
             # Нормалізуємо назву колонки до snake_case
             col_name = self._normalize_column_name(row['COLUMN_NAME'])
-            columns[col_name] = {
+            table['columns'][col_name] = {
                 'type': self._convert_sql_type_to_yaml(row),
-                'nullable': row['IS_NULLABLE'] == 'YES',
+                'nullable': bool(row['IS_NULLABLE']),
                 'default': row['COLUMN_DEFAULT'],
                 'primary_key': bool(row['IS_PRIMARY_KEY']),
                 'foreign_key': bool(row['IS_FOREIGN_KEY'])
             }
-        
-        return {'columns': columns}
+
+        for row in index_rows:
+            table = structures.setdefault(row['TABLE_NAME'].lower(), {'columns': {}, 'indexes': {}})
+            index = table['indexes'].setdefault(row['INDEX_NAME'], {
+                'columns': [],
+                'include': [],
+                'unique': bool(row['IS_UNIQUE']),
+                'primary_key': bool(row['IS_PRIMARY_KEY']),
+                'type': row['INDEX_TYPE'],
+                'where': row['FILTER_DEFINITION'],
+                'fillfactor': row['FILL_FACTOR'],
+                'data_compression': row['DATA_COMPRESSION']
+            })
+            column_name = self._normalize_column_name(row['COLUMN_NAME'])
+            index['include' if row['IS_INCLUDED_COLUMN'] else 'columns'].append(column_name)
+
+        return structures
     
     def _convert_sql_type_to_yaml(self, row: Dict) -> str:
         """Конвертувати SQL тип в YAML формат"""
@@ -86,7 +146,10 @@ class SchemaComparator:
         differences = {
             'add_columns': [],
             'modify_columns': [],
-            'drop_columns': []
+            'drop_columns': [],
+            'add_indexes': [],
+            'rebuild_indexes': [],
+            'nonclustered_primary_key': []
         }
         
         db_columns = db_structure.get('columns', {})
@@ -109,8 +172,61 @@ class SchemaComparator:
             if col_name not in yaml_columns:
                 differences['drop_columns'].append(col_name)
         
+        # Індекси, яких немає в БД або які відрізняються (зайві індекси БД не видаляються)
+        db_indexes = {name.lower(): index for name, index in db_structure.get('indexes', {}).items()}
+        for index in yaml_structure.get('indexes', []):
+            db_index = db_indexes.get(index['name'].lower())
+            if db_index is None:
+                differences['add_indexes'].append(index)
+            elif self._indexes_different(db_index, index):
+                differences['rebuild_indexes'].append(index)
+        
+        # Власний clustered індекс потребує NONCLUSTERED первинного ключа
+        if has_clustered_index(yaml_structure):
+            for name, db_index in db_structure.get('indexes', {}).items():
+                if db_index['primary_key'] and db_index['type'] == 'CLUSTERED':
+                    differences['nonclustered_primary_key'].append((name, db_index['columns']))
+        
         return differences
     
+    def _indexes_different(self, db_index: Dict, yaml_index: Dict) -> bool:
+        """Перевірити чи індекс БД відповідає опису в схемі"""
+        columnstore = bool(yaml_index.get('columnstore'))
+        clustered = bool(yaml_index.get('clustered'))
+        expected_type = f"{'CLUSTERED' if clustered else 'NONCLUSTERED'}{' COLUMNSTORE' if columnstore else ''}"
+        if db_index['type'] != expected_type:
+            return True
+        
+        if columnstore:
+            # Колонки columnstore не мають порядку ключа
+            if not clustered and set(db_index['columns'] + db_index['include']) != set(yaml_index['columns']):
+                return True
+        else:
+            if db_index['columns'] != list(yaml_index['columns']):
+                return True
+            if set(db_index['include']) != set(yaml_index.get('include', []) or []):
+                return True
+            if db_index['unique'] != bool(yaml_index.get('unique')):
+                return True
+            # 0 і 100 в БД - однаково "без fillfactor"
+            if (db_index['fillfactor'] or 100) != int(yaml_index.get('fillfactor') or 100):
+                return True
+        
+        if self._normalize_filter(db_index['where']) != self._normalize_filter(yaml_index.get('where')):
+            return True
+        
+        expected_compression = (yaml_index.get('data_compression') or ('COLUMNSTORE' if columnstore else 'NONE')).upper()
+        if (db_index['data_compression'] or 'NONE').upper() != expected_compression:
+            return True
+        
+        return False
+    
+    def _normalize_filter(self, definition: Optional[str]) -> str:
+        """SQL Server зберігає фільтр як ([mark_deleted]=(0)) - прибираємо дужки, пробіли і регістр"""
+        if not definition:
+            return ''
+        return re.sub(r'[\s\[\]()]', '', definition).lower()
+    
     def _columns_different(self, db_def: Dict, yaml_def: Dict) -> bool:
         """Перевірити чи різняться колонки"""
         # Ігнорувати PRIMARY KEY колонки
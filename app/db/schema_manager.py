@@ -1,12 +1,55 @@
 import yaml
 import os
-from typing import Dict, List, Any, Optional
+import hashlib
+import json
+import pickle
+from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
 import logging
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Збільшити при зміні формату кешу або логіки розв'язання схем
+SCHEMA_CACHE_VERSION = 4
+
+
+def build_index_sql(table_name: str, index: Dict) -> str:
+    """CREATE INDEX для одного індексу схеми.
+    
+    Ключі індексу: columns, name, unique, include, where, clustered, columnstore,
+    fillfactor, data_compression (NONE/ROW/PAGE, для columnstore - COLUMNSTORE/COLUMNSTORE_ARCHIVE).
+    """
+    index_name = index.get('name', f"IX_{table_name}_{'_'.join(index.get('columns', []))}")
+    kind = "CLUSTERED" if index.get('clustered') else "NONCLUSTERED"
+    
+    options = []
+    if index.get('fillfactor') and not index.get('columnstore'):
+        options.append(f"FILLFACTOR = {int(index['fillfactor'])}")
+    if index.get('data_compression'):
+        options.append(f"DATA_COMPRESSION = {index['data_compression'].upper()}")
+    with_sql = f" WITH ({', '.join(options)})" if options else ""
+    where_sql = f" WHERE {index['where']}" if index.get('where') else ""
+    
+    if index.get('columnstore'):
+        if index.get('clustered'):
+            # Clustered columnstore містить всю таблицю - без списку колонок
+            return f"CREATE CLUSTERED COLUMNSTORE INDEX {index_name} ON {table_name}{with_sql};"
+        columns = ', '.join(index['columns'])
+        return f"CREATE NONCLUSTERED COLUMNSTORE INDEX {index_name} ON {table_name} ({columns}){where_sql}{with_sql};"
+    
+    unique = "UNIQUE " if index.get('unique') else ""
+    columns = ', '.join(index['columns'])
+    include_sql = f" INCLUDE ({', '.join(index['include'])})" if index.get('include') else ""
+    return f"CREATE {unique}{kind} INDEX {index_name} ON {table_name} ({columns}){include_sql}{where_sql}{with_sql};"
+
+def has_clustered_index(table_def: Dict) -> bool:
+    """Чи оголошено в схемі власний clustered індекс (тоді PK - NONCLUSTERED)"""
+    return any(index.get('clustered') for index in table_def.get('indexes', []) or [])
+
+# C-реалізація парсера (libyaml) в рази швидша за pure-Python
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 class SchemaManager:
     """Менеджер для роботи зі схемами бази даних"""
     
@@ -17,12 +60,21 @@ class SchemaManager:
         self.core_schema: Dict = {}
         self.plugin_schemas: Dict[str, Dict] = {}
         self.resolved_tables: Dict[str, Dict] = {}
+        # Таблиця -> файл схеми, description/version файлу і визначення таблиці
+        self.table_index: Dict[str, Dict[str, Any]] = {}
         self._loaded = False
+        self.cache_path = Path(settings.DB_SCHEMA_CACHE_PATH) if settings.DB_SCHEMA_CACHE_PATH else None
+        # Файл схеми -> (mtime_ns, size, sha256)
+        self._manifest: Dict[str, Tuple[int, int, str]] = {}
     
     def load_all_schemas(self):
-        """Завантажити всі схеми з усіх тек"""
+        """Завантажити всі схеми з усіх тек (з компільованого кешу, якщо файли не змінились)"""
         schema_files = self.discover_schema_files()
         
+        if self._load_from_cache(schema_files):
+            self._loaded = True
+            return
+        
         # Завантажити parent схеми
         for parent_file in schema_files.get('parents', []):
             self._load_parent_schema(parent_file)
@@ -37,6 +89,83 @@ class SchemaManager:
         # ДОДАТИ: Розв'язати наслідування
         self._resolve_all_tables()
         self._loaded = True
+        self._save_cache()
+    
+    def _cache_state(self) -> Dict[str, Any]:
+        """Дані, що зберігаються в кеші"""
+        return {
+            'parent_tables': self.parent_tables,
+            'tables': self.tables,
+            'resolved_tables': self.resolved_tables,
+            'table_index': self.table_index,
+        }
+    
+    def _load_from_cache(self, schema_files: Dict[str, List[Path]]) -> bool:
+        """Відновити схеми з кешу; False - кеш відсутній або застарів"""
+        if self.cache_path is None or not self.cache_path.exists():
+            return False
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cache = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Schema cache {self.cache_path} is unreadable, rebuilding: {e}")
+            return False
+        
+        if cache.get('version') != SCHEMA_CACHE_VERSION or cache.get('schemas_dir') != str(self.schemas_dir.resolve()):
+            return False
+        
+        manifest = cache['manifest']
+        current_files = {str(path) for paths in schema_files.values() for path in paths}
+        if current_files != set(manifest):
+            return False
+        
+        refreshed = {}
+        for file_path, (mtime_ns, size, digest) in manifest.items():
+            stat = os.stat(file_path)
+            if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+                refreshed[file_path] = (mtime_ns, size, digest)
+                continue
+            # mtime змінився (checkout, копіювання) - перевіряємо вміст
+            content_digest = hashlib.sha256(Path(file_path).read_bytes()).hexdigest()
+            if content_digest != digest:
+                return False
+            refreshed[file_path] = (stat.st_mtime_ns, stat.st_size, digest)
+        
+        for name, value in cache['state'].items():
+            setattr(self, name, value)
+        self._manifest = refreshed
+        if refreshed != manifest:
+            self._save_cache()
+        logger.debug(f"Loaded {len(self.resolved_tables)} tables from schema cache")
+        return True
+    
+    def _save_cache(self):
+        """Записати розв'язані схеми в кеш (атомарно)"""
+        if self.cache_path is None:
+            return
+        cache = {
+            'version': SCHEMA_CACHE_VERSION,
+            'schemas_dir': str(self.schemas_dir.resolve()),
+            'manifest': self._manifest,
+            'state': self._cache_state(),
+        }
+        tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"Could not write schema cache {self.cache_path}: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+    
+    def _read_schema_file(self, file_path) -> Any:
+        """Прочитати YAML-файл схеми і запам'ятати його відбиток для кешу"""
+        content = Path(file_path).read_bytes()
+        stat = os.stat(file_path)
+        self._manifest[str(file_path)] = (stat.st_mtime_ns, stat.st_size, hashlib.sha256(content).hexdigest())
+        return yaml.load(content, Loader=YamlLoader)
     
     def load_parent_tables(self) -> Dict:
         """Завантажити батьківські таблиці"""
@@ -98,6 +227,44 @@ class SchemaManager:
                 # Додаємо префікс плагіна до назви таблиці якщо конфлікт
                 full_table_name = f"{plugin_name}_{table_name}" if table_name in self.resolved_tables else table_name
                 self.resolved_tables[full_table_name] = self.resolve_table_inheritance(table_name, table_def)
+        
+        # Індекси для FK та lookup_keys
+        for table_name, table_def in self.resolved_tables.items():
+            indexes = self.build_table_indexes(table_name, table_def)
+            if indexes:
+                table_def['indexes'] = indexes
+    
+    def build_table_indexes(self, table_name: str, table_def: Dict) -> List[Dict]:
+        """Явні індекси таблиці + автоматичні для foreign_key колонок і lookup_keys.
+        
+        Вимкнути: auto_indexes: false для таблиці або index: false для колонки.
+        """
+        indexes = [dict(index) for index in table_def.get('indexes', []) or []]
+        for index in indexes:
+            index.setdefault('name', f"IX_{table_name}_{'_'.join(index.get('columns', []))}")
+        self._validate_indexes(table_name, indexes)
+        if not table_def.get('auto_indexes', True):
+            return indexes
+        
+        candidates = []
+        for key in table_def.get('lookup_keys', []) or []:
+            key_def = {'columns': list(key)} if isinstance(key, (list, tuple)) else dict(key)
+            candidates.append(key_def)
+        for col_name, col_def in table_def.get('columns', {}).items():
+            if col_def.get('foreign_key') and not col_def.get('primary_key') and col_def.get('index', True):
+                candidates.append({'columns': [col_name]})
+        
+        for candidate in candidates:
+            # Індекс з тими ж першими колонками вже покриває пошук
+            width = len(candidate['columns'])
+            if any(index.get('columns', [])[:width] == candidate['columns']
+                   and not index.get('columnstore') and not index.get('where') for index in indexes):
+                continue
+            candidate.setdefault('name', f"IX_{table_name}_{'_'.join(candidate['columns'])}")
+            candidate['auto'] = True
+            indexes.append(candidate)
+        
+        return indexes
     
     def resolve_table_inheritance(self, table_name: str, table_def: Dict) -> Dict:
         """Розв'язати наслідування для таблиці"""
@@ -128,6 +295,18 @@ class SchemaManager:
         merged.update(table_columns)
         return merged
     
+    def _validate_indexes(self, table_name: str, indexes: List[Dict]):
+        """Перевірити комбінації опцій індексів"""
+        if sum(1 for index in indexes if index.get('clustered')) > 1:
+            raise ValueError(f"Table {table_name} declares more than one clustered index")
+        for index in indexes:
+            if index.get('include') and (index.get('clustered') or index.get('columnstore')):
+                raise ValueError(f"Index {index['name']}: include is only allowed on nonclustered rowstore indexes")
+            if index.get('where') and index.get('clustered'):
+                raise ValueError(f"Index {index['name']}: clustered index cannot be filtered")
+            if not index.get('columns') and not (index.get('columnstore') and index.get('clustered')):
+                raise ValueError(f"Index {index['name']}: columns are required")
+    
     def generate_create_table_sql(self, table_name: str, table_def: Dict) -> str:
         """Згенерувати SQL CREATE TABLE"""
         columns = table_def.get('columns', {})
@@ -147,7 +326,8 @@ class SchemaManager:
         
         # PRIMARY KEY constraint
         if primary_keys:
-            pk_constraint = f"CONSTRAINT PK_{table_name} PRIMARY KEY ({', '.join(primary_keys)})"
+            pk_kind = " NONCLUSTERED" if has_clustered_index(table_def) else ""
+            pk_constraint = f"CONSTRAINT PK_{table_name} PRIMARY KEY{pk_kind} ({', '.join(primary_keys)})"
             column_definitions.append(pk_constraint)
         
         columns_sql = ',\n    '.join(column_definitions)
@@ -196,17 +376,7 @@ class SchemaManager:
     
     def generate_indexes_sql(self, table_name: str, indexes: List[Dict]) -> List[str]:
         """Згенерувати SQL для індексів"""
-        index_sqls = []
-        
-        for index in indexes:
-            index_name = index.get('name', f"IX_{table_name}_{'_'.join(index['columns'])}")
-            columns = ', '.join(index['columns'])
-            unique = "UNIQUE " if index.get('unique') else ""
-            
-            sql = f"CREATE {unique}INDEX {index_name} ON {table_name} ({columns});"
-            index_sqls.append(sql)
-        
-        return index_sqls
+        return [build_index_sql(table_name, index) for index in indexes]
     
     def validate_foreign_keys(self) -> List[str]:
         """Валідувати foreign keys"""
@@ -250,6 +420,16 @@ class SchemaManager:
             self.load_all_schemas()
         return self.resolved_tables
     
+    def get_table_fingerprint(self, table_name: str) -> str:
+        """SHA-256 канонічного JSON розв'язаного визначення таблиці"""
+        table_def = self.get_all_tables()[table_name]
+        canonical = json.dumps(table_def, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def get_table_fingerprints(self) -> Dict[str, str]:
+        """Відбитки всіх розв'язаних таблиць"""
+        return {table_name: self.get_table_fingerprint(table_name) for table_name in self.get_all_tables()}
+    
     def get_table_creation_order(self) -> List[str]:
         """Get table creation order (topological sorting with sys_data_types first)"""
         dependencies = self.get_table_dependencies()
@@ -304,26 +484,31 @@ class SchemaManager:
     def _load_parent_schema(self, file_path: str):
         """Завантажити parent схему з файлу"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = yaml.safe_load(file)
-                if data and 'parent_tables' in data:
-                    parent_tables = data['parent_tables']
-                    if parent_tables:  # Перевірка на None
-                        self.parent_tables.update(parent_tables)
-                        logger.info(f"Loaded {len(parent_tables)} parent tables from {file_path}")
-                    else:
-                        logger.warning(f"Empty parent_tables in {file_path}")
+            data = self._read_schema_file(file_path)
+            if data and 'parent_tables' in data:
+                parent_tables = data['parent_tables']
+                if parent_tables:  # Перевірка на None
+                    self.parent_tables.update(parent_tables)
+                    logger.info(f"Loaded {len(parent_tables)} parent tables from {file_path}")
                 else:
-                    logger.warning(f"No parent_tables found in {file_path}")
+                    logger.warning(f"Empty parent_tables in {file_path}")
+            else:
+                logger.warning(f"No parent_tables found in {file_path}")
         except Exception as e:
             logger.error(f"Failed to load parent schema from {file_path}: {e}")
 
     def _load_table_schema(self, file_path: str):
         """Завантажити схему таблиць з файлу"""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = yaml.safe_load(file)
-            if 'tables' in data:
-                self.tables.update(data['tables'])
+        data = self._read_schema_file(file_path)
+        if 'tables' in data:
+            self.tables.update(data['tables'])
+            for table_name, table_def in data['tables'].items():
+                self.table_index[table_name] = {
+                    'file': str(file_path),
+                    'description': data.get('description', ''),
+                    'version': data.get('version', '1.0.0'),
+                    'table_definition': table_def
+                }
     
     def generate_alter_commands(self, table_name: str, differences: Dict[str, List]) -> List[str]:
         """Згенерувати команди ALTER TABLE"""
@@ -385,33 +570,17 @@ class SchemaManager:
     def get_schema_info_for_table(self, table_name: str) -> Dict[str, Any]:
         """Get schema information for specific table including description"""
         
-        # Search through loaded schema files to find table definition
-        schema_files = self.discover_schema_files()
+        if not self._loaded:
+            self.load_all_schemas()
         
-        for category in schema_files:
-            if category == 'parents':
-                continue
-            
-            for schema_file in schema_files[category]:
-                try:
-                    with open(schema_file, 'r', encoding='utf-8') as file:
-                        data = yaml.safe_load(file)
-                        
-                        # Check if this file contains our table
-                        tables = data.get('tables', {})
-                        if table_name in tables:
-                            return {
-                                'description': data.get('description', ''),
-                                'version': data.get('version', '1.0.0'),
-                                'table_definition': tables[table_name]
-                            }
-                except Exception as e:
-                    logger.warning(f"Could not read schema file {schema_file}: {e}")
-                    continue
+        info = self.table_index.get(table_name)
+        if info is not None:
+            return info
         
         # If not found, return empty info
         logger.warning(f"Schema info not found for table: {table_name}")
         return {
+            'file': None,
             'description': '',
             'version': '1.0.0',
             'table_definition': {}
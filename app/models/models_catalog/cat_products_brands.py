@@ -21,15 +21,26 @@ class Cat_ProductBrand(Catalog):
         self.table_two: CatalogProductBrandDTO = None
 
     @classmethod
-    def import_from_rows_prepare(rows: list):
+    def import_from_rows_prepare(cls, rows: list):
         for row in rows:
             row['Mark_deleted'] = value_to_bool_bit(row.get('Mark_deleted'))
     
     @classmethod
-    async def import_from_rows(cls, rows: list, source_id: int, user_id: int):
+    async def import_from_rows(cls, rows: list, source_id: int, user_id: int, bulk: bool = False, batch_size: int = 1000):
         
         cls.import_from_rows_prepare(rows)
 
+        if bulk:
+            items = [
+                {
+                    "name": row.get('Name'),
+                    "mark_deleted": row.get('Mark_deleted', 0),
+                    "external_id": row.get('External_ID', None)
+                }
+                for row in rows
+            ]
+            return await cls.bulk_upsert(items, source_id, user_id=user_id, batch_size=batch_size)
+
         result = []
         for row in rows:
             brand = await cls.get_by_external_id(row.get('External_ID'), source_id)
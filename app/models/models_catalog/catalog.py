@@ -1,7 +1,13 @@
+import logging
 from fastapi.params import Depends
+from pydantic import ValidationError
 from app.db.database import db_manager
+from app.services.database_service import DatabaseService
+from app.services.table_import_schema_service import table_import_schema_service
 from app.core.security import get_current_user
 
+logger = logging.getLogger(__name__)
+
 class Catalog:
     _db_head = {"table_name": None, "table_typeid": None, "columns": ["name", "mark_deleted", "_created_by"]}
     _db_tables = None
@@ -51,31 +57,157 @@ class Catalog:
             return inserted_id
 
     async def save(self, user_id: int = None):
-        data = {col: getattr(self.head, col) for col in self._db_head["columns"]}
-        
-        if self.head._id is None:
-
-            data['_created_by'] = user_id 
-
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?'] * len(data))
-            sql = f"INSERT INTO {self._db_head['table_name']} ({columns}) OUTPUT INSERTED._id VALUES ({placeholders})"
-            async with db_manager.get_transaction() as cursor:
-                await cursor.execute(sql, tuple(data.values()))
-                inserted_id_row = await cursor.fetchone()
-                inserted_id = inserted_id_row[0] if inserted_id_row else None
-                self.head._id = inserted_id
-        else:
-            set_clause = ', '.join([f"{col} = ?" for col in data.keys()])
-            sql = f"UPDATE {self._db_head['table_name']} SET {set_clause} WHERE _id = ?"
-            async with db_manager.get_transaction() as cursor:
-                await cursor.execute(sql, tuple(data.values()) + (self.head._id,))
-                inserted_id = self.head._id
+        # Запис і мапінг зовнішнього ID - одна транзакція
+        original_id = self.head._id
+        try:
+            async with db_manager.unit_of_work():
+                data = {col: getattr(self.head, col) for col in self._db_head["columns"]}
+
+                if self.head._id is None:
 
-        await self.save_external_id()
+                    data['_created_by'] = user_id 
+
+                    columns = ', '.join(data.keys())
+                    placeholders = ', '.join(['?'] * len(data))
+                    sql = f"INSERT INTO {self._db_head['table_name']} ({columns}) OUTPUT INSERTED._id VALUES ({placeholders})"
+                    async with db_manager.get_transaction() as cursor:
+                        await cursor.execute(sql, tuple(data.values()))
+                        inserted_id_row = await cursor.fetchone()
+                        inserted_id = inserted_id_row[0] if inserted_id_row else None
+                        self.head._id = inserted_id
+                else:
+                    set_clause = ', '.join([f"{col} = ?" for col in data.keys()])
+                    sql = f"UPDATE {self._db_head['table_name']} SET {set_clause} WHERE _id = ?"
+                    async with db_manager.get_transaction() as cursor:
+                        await cursor.execute(sql, tuple(data.values()) + (self.head._id,))
+                        inserted_id = self.head._id
+
+                await self.save_external_id()
+        except Exception:
+            # Відкочений INSERT не повинен залишити _id в об'єкті
+            self.head._id = original_id
+            raise
 
         return inserted_id
-    
+
+    @classmethod
+    async def bulk_upsert(cls, items: list, source_id: int, user_id: int = None, batch_size: int = 1000):
+        """Пакетний upsert: staging-таблиця + MERGE + мапінг зовнішніх ID в одній транзакції (з повтором)"""
+        result = {"total": len(items), "inserted": 0, "updated": 0, "unchanged": 0, "duplicates": 0, "rejected": 0}
+
+        table_name = cls._db_head['table_name']
+        columns = [col for col in cls._db_head["columns"] if col != "_created_by"]
+
+        # Модель pydantic з YAML схеми: рядки з порожнім обов'язковим значенням, невалідним типом
+        # чи задовгим текстом не записуємо (інакше падає весь пакет), решта - з приведеними типами
+        validator = table_import_schema_service.get_table_validator(table_name)
+        if validator.columns:
+            valid, valid_rows, row_errors = validator.validate_rows(items, columns)
+            valid_items = [items[idx] for idx in valid]
+            if row_errors:
+                row_idx = min(row_errors)
+                logger.warning(f"{table_name}: rejected {len(row_errors)} rows, row {row_idx + 1}: {row_errors[row_idx]}")
+        else:
+            # name обов'язковий в catalog
+            valid_items = [item for item in items if item.get('name') not in (None, '')]
+            valid_rows = [tuple(item.get(col) for col in columns) for item in valid_items]
+        result["rejected"] = len(items) - len(valid_items)
+        if not valid_items:
+            return result
+
+        if cls._db_head['table_typeid'] is None:
+            await cls.init_head_typeid()
+
+        # external_id - за правилом колонки cat_external_data (тип staging-таблиці теж з неї):
+        # задовгий чи порожній після обрізання зовнішній ID відхиляє рядок
+        external_rule = table_import_schema_service.get_table_validator('cat_external_data').columns['external_id']
+
+        # Дублікати external_id в файлі - перемагає останній рядок (як і в построковому імпорті)
+        keyed = {}
+        unkeyed = []
+        external_errors = []
+        for item, row in zip(valid_items, valid_rows):
+            external_id = item.get('external_id')
+            if external_id is None:
+                unkeyed.append(row + (None,))
+                continue
+            try:
+                keyed[external_rule.validate(external_id)] = row
+            except ValidationError as e:
+                external_errors.append(external_rule.error_message(e.errors()[0]['type'], external_id))
+        if external_errors:
+            logger.warning(f"{table_name}: rejected {len(external_errors)} rows by external_id: {external_errors[0]}")
+            result["rejected"] += len(external_errors)
+        stage_rows = [row + (external_id,) for external_id, row in keyed.items()] + unkeyed
+        result["duplicates"] = len(valid_items) - len(external_errors) - len(stage_rows)
+        if not stage_rows:
+            return result
+
+        column_list = ', '.join(columns)
+        source_list = ', '.join(f"s.{col}" for col in columns)
+
+        # Deadlock/тайм-аут блокування - повтор усієї транзакції (відкочена повністю, staging створюється заново)
+        async def write(cursor):
+            await cursor.execute(
+                "IF OBJECT_ID('tempdb..#catalog_import') IS NOT NULL DROP TABLE #catalog_import; "
+                "IF OBJECT_ID('tempdb..#catalog_import_new') IS NOT NULL DROP TABLE #catalog_import_new;"
+            )
+            # Структура staging-таблиці береться з цільової таблиці
+            await cursor.execute(f"SELECT TOP 0 {column_list} INTO #catalog_import FROM {table_name}")
+            await cursor.execute(f"ALTER TABLE #catalog_import ADD external_id {external_rule.type} NULL, internal_id BIGINT NULL")
+            await cursor.execute(f"CREATE TABLE #catalog_import_new (external_id {external_rule.type} NULL, internal_id BIGINT NOT NULL)")
+
+            await DatabaseService.bulk_insert(
+                "#catalog_import", columns + ["external_id"], stage_rows,
+                batch_size=batch_size, identity_column=None, cursor=cursor
+            )
+
+            # Один set-based пошук всіх зовнішніх ID
+            await cursor.execute(
+                "UPDATE s SET s.internal_id = m.internal_id "
+                "FROM #catalog_import s "
+                "INNER JOIN cat_external_data m ON m.external_id = s.external_id "
+                "AND m.external_source_id = ? AND m.internal_typeid = ?",
+                (source_id, cls._db_head['table_typeid'])
+            )
+            await cursor.execute("SELECT COUNT(*) FROM #catalog_import WHERE internal_id IS NOT NULL")
+            existing = (await cursor.fetchone())[0]
+
+            # Оновлюємо тільки змінені рядки (INTERSECT коректно порівнює NULL)
+            set_clause = ', '.join(f"t.{col} = s.{col}" for col in columns)
+            target_list = ', '.join(f"t.{col}" for col in columns)
+            await cursor.execute(
+                f"UPDATE t SET {set_clause} "
+                f"FROM {table_name} t "
+                f"INNER JOIN #catalog_import s ON t._id = s.internal_id "
+                f"WHERE NOT EXISTS (SELECT {target_list} INTERSECT SELECT {source_list})"
+            )
+            result["updated"] = max(cursor.rowcount, 0)
+            result["unchanged"] = existing - result["updated"]
+
+            # MERGE з ON 1 = 0 дозволяє повернути external_id разом з новим _id
+            await cursor.execute(
+                f"MERGE INTO {table_name} AS t "
+                f"USING (SELECT {column_list}, external_id FROM #catalog_import WHERE internal_id IS NULL) AS s "
+                f"ON 1 = 0 "
+                f"WHEN NOT MATCHED THEN INSERT ({column_list}, _created_by) VALUES ({source_list}, ?) "
+                f"OUTPUT s.external_id, INSERTED._id INTO #catalog_import_new (external_id, internal_id);",
+                (user_id,)
+            )
+            result["inserted"] = max(cursor.rowcount, 0)
+
+            await cursor.execute(
+                "INSERT INTO cat_external_data (external_id, external_source_id, internal_id, internal_typeid) "
+                "SELECT external_id, ?, internal_id, ? FROM #catalog_import_new WHERE external_id IS NOT NULL",
+                (source_id, cls._db_head['table_typeid'])
+            )
+
+            await cursor.execute("DROP TABLE #catalog_import; DROP TABLE #catalog_import_new;")
+
+        await db_manager.run_in_transaction(write)
+
+        return result
+
     @classmethod
     def new(cls):
         obj = cls()
@@ -1,14 +1,54 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Union
+from functools import wraps
+import inspect
+import time
+from app.core.metrics import metrics
 from app.db.database import db_manager
+from app.db.retry import RetryPolicy
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _timed(func):
+    """Метрики методу: db.query.<method>.seconds (включно з очікуванням пулу) і .errors"""
+    name = f"db.query.{func.__name__}"
+
+    if inspect.isasyncgenfunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            generator = func(*args, **kwargs)
+            try:
+                async for item in generator:
+                    yield item
+            except Exception:
+                metrics.increment(f"{name}.errors")
+                raise
+            finally:
+                await generator.aclose()
+                metrics.observe(f"{name}.seconds", time.perf_counter() - started)
+        return wrapper
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            metrics.increment(f"{name}.errors")
+            raise
+        finally:
+            metrics.observe(f"{name}.seconds", time.perf_counter() - started)
+    return wrapper
+
+
 class DatabaseService:
     @staticmethod
-    async def execute_query(query: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """SELECT запити"""
-        async with db_manager.get_connection() as conn:
+    @_timed
+    async def execute_query(query: str, params: tuple = None, readonly: bool = True) -> List[Dict[str, Any]]:
+        """SELECT запити (readonly=True - з репліки, якщо налаштована; False - з primary)"""
+        async with db_manager.get_connection(readonly=readonly) as conn:
             async with conn.cursor() as cursor:
                 await cursor.execute(query, params or ())
                 columns = [desc[0] for desc in cursor.description] if cursor.description else []
@@ -16,6 +56,30 @@ class DatabaseService:
                 return [dict(zip(columns, row)) for row in rows]
     
     @staticmethod
+    @_timed
+    async def stream_query(query: str, params: tuple = None, chunk_size: int = 1000,
+                           as_tuples: bool = False, readonly: bool = True) -> AsyncIterator[Union[Dict[str, Any], List[str], Any]]:
+        """SELECT запити рядок за рядком (з'єднання утримується до кінця ітерації).
+
+        З драйвера рядки читаються порціями по chunk_size через fetchmany. Повертає dict на рядок,
+        або при as_tuples=True - спершу список назв колонок, далі рядки драйвера без конвертації
+        (значення за позицією, в порядку колонок).
+        """
+        async with db_manager.get_connection(shared=False, readonly=readonly) as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(query, params or ())
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                if as_tuples:
+                    yield columns
+                while True:
+                    rows = await cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row if as_tuples else dict(zip(columns, row))
+
+    @staticmethod
+    @_timed
     async def execute_non_query(query: str, params: tuple = None) -> int:
         """INSERT/UPDATE/DELETE запити"""
         async with db_manager.get_transaction() as cursor:
@@ -23,15 +87,136 @@ class DatabaseService:
             return cursor.rowcount
     
     @staticmethod
-    async def execute_scalar(query: str, params: tuple = None) -> Any:
-        """Запити що повертають одне значення"""
-        async with db_manager.get_connection() as conn:
+    @_timed
+    async def bulk_insert(table: str, columns: List[str], rows: List[tuple], batch_size: int = 1000,
+                          identity_column: Optional[str] = '_id', cursor=None,
+                          retry: Optional[RetryPolicy] = None) -> List[Any]:
+        """Пакетна вставка рядків (значення в порядку columns).
+
+        Повертає identity вставлених рядків в порядку rows. З identity_column=None
+        вставляє через fast_executemany без OUTPUT і повертає порожній список.
+        cursor - виконати в уже відкритій транзакції; інакше - власна транзакція
+        з повтором при deadlock/тайм-ауті (retry, за замовчуванням DB_RETRY_*).
+        Після розриву з'єднання не повторюється - рядки могли вже бути вставлені.
+        """
+        rows = [tuple(row) for row in rows]
+        if not rows:
+            return []
+        if cursor is None:
+            return await db_manager.run_in_transaction(
+                lambda cursor: DatabaseService._bulk_insert(cursor, table, columns, rows, batch_size, identity_column),
+                retry
+            )
+        return await DatabaseService._bulk_insert(cursor, table, columns, rows, batch_size, identity_column)
+
+    @staticmethod
+    async def _bulk_insert(cursor, table: str, columns: List[str], rows: List[tuple], batch_size: int,
+                           identity_column: Optional[str]) -> List[Any]:
+        column_list = ', '.join(columns)
+        if identity_column is None:
+            sql = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(['?'] * len(columns))})"
+            if await DatabaseService._execute_many_fast(cursor, sql, rows, batch_size):
+                return []
+
+        # Multi-row VALUES; __ord відновлює порядок identity (OUTPUT порядок не гарантує)
+        width = len(columns) + (0 if identity_column is None else 1)
+        step = DatabaseService._rows_per_statement(width, batch_size)
+        row_placeholders = f"({', '.join(['?'] * width)})"
+        source_list = ', '.join(f"src.{col}" for col in columns)
+        identities = []
+        for start in range(0, len(rows), step):
+            chunk = rows[start:start + step]
+            values = ', '.join([row_placeholders] * len(chunk))
+            if identity_column is None:
+                await cursor.execute(
+                    f"INSERT INTO {table} ({column_list}) VALUES {values}",
+                    tuple(value for row in chunk for value in row)
+                )
+                continue
+            await cursor.execute(
+                f"MERGE INTO {table} AS t "
+                f"USING (VALUES {values}) AS src (__ord, {column_list}) "
+                f"ON 1 = 0 "
+                f"WHEN NOT MATCHED THEN INSERT ({column_list}) VALUES ({source_list}) "
+                f"OUTPUT src.__ord, INSERTED.{identity_column};",
+                tuple(value for position, row in enumerate(chunk) for value in (position,) + row)
+            )
+            output = await cursor.fetchall()
+            identities.extend(row[1] for row in sorted(output, key=lambda row: row[0]))
+        return identities
+
+    @staticmethod
+    @_timed
+    async def bulk_update(table: str, columns: List[str], rows: List[tuple], key_column: str = '_id',
+                          batch_size: int = 1000, cursor=None, retry: Optional[RetryPolicy] = None) -> List[Any]:
+        """Пакетне оновлення: рядок - значення в порядку columns, останнім ключ.
+
+        Один UPDATE ... FROM (VALUES ...) на пакет; повертає ключі оновлених рядків.
+        Без cursor - власна транзакція з повтором, як у bulk_insert, і при розриві з'єднання
+        (повторне оновлення тими ж значеннями безпечне).
+        """
+        rows = [tuple(row) for row in rows]
+        if not rows:
+            return []
+        if cursor is None:
+            return await db_manager.run_in_transaction(
+                lambda cursor: DatabaseService._bulk_update(cursor, table, columns, rows, key_column, batch_size),
+                retry, idempotent=True
+            )
+        return await DatabaseService._bulk_update(cursor, table, columns, rows, key_column, batch_size)
+
+    @staticmethod
+    async def _bulk_update(cursor, table: str, columns: List[str], rows: List[tuple], key_column: str,
+                           batch_size: int) -> List[Any]:
+        width = len(columns) + 1
+        step = DatabaseService._rows_per_statement(width, batch_size)
+        row_placeholders = f"({', '.join(['?'] * width)})"
+        set_clause = ', '.join(f"t.{col} = src.{col}" for col in columns)
+        updated = []
+        for start in range(0, len(rows), step):
+            chunk = rows[start:start + step]
+            await cursor.execute(
+                f"UPDATE t SET {set_clause} "
+                f"OUTPUT INSERTED.{key_column} "
+                f"FROM {table} AS t "
+                f"INNER JOIN (VALUES {', '.join([row_placeholders] * len(chunk))}) "
+                f"AS src ({', '.join(columns)}, __key) ON t.{key_column} = src.__key",
+                tuple(value for row in chunk for value in row)
+            )
+            updated.extend(row[0] for row in await cursor.fetchall())
+        return updated
+
+    @staticmethod
+    def _rows_per_statement(width: int, batch_size: int) -> int:
+        # SQL Server: до 2100 параметрів і 1000 рядків VALUES в одному запиті
+        return max(1, min(batch_size, 1000, 2099 // width))
+
+    @staticmethod
+    async def _execute_many_fast(cursor, sql: str, rows: List[tuple], batch_size: int) -> bool:
+        """executemany з pyodbc fast_executemany (параметри пакетом в один round-trip)"""
+        raw_cursor = getattr(cursor, '_impl', None)
+        if raw_cursor is None or not hasattr(raw_cursor, 'fast_executemany'):
+            return False
+        raw_cursor.fast_executemany = True
+        try:
+            for start in range(0, len(rows), batch_size):
+                await cursor.executemany(sql, rows[start:start + batch_size])
+        finally:
+            raw_cursor.fast_executemany = False
+        return True
+
+    @staticmethod
+    @_timed
+    async def execute_scalar(query: str, params: tuple = None, readonly: bool = True) -> Any:
+        """Запити що повертають одне значення (readonly - як в execute_query)"""
+        async with db_manager.get_connection(readonly=readonly) as conn:
             async with conn.cursor() as cursor:
                 await cursor.execute(query, params or ())
                 row = await cursor.fetchone()
                 return row[0] if row else None
     
     @staticmethod
+    @_timed
     async def execute_procedure(proc_name: str, params: tuple = None) -> List[Dict[str, Any]]:
         """Виконання збережених процедур"""
         async with db_manager.get_connection() as conn:
@@ -47,6 +232,7 @@ class DatabaseService:
         return db_manager.get_transaction()
 
     @staticmethod 
+    @_timed
     async def execute_in_transaction(queries_with_params):
         """Виконати список запитів в одній транзакції"""
         async with db_manager.get_transaction() as cursor:
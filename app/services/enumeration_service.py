@@ -64,14 +64,14 @@ class EnumerationService:
         return enumerations
     
     async def get_existing_enumeration_types(self) -> Dict[str, Dict[str, Any]]:
-        """Get existing enumeration types from database"""
+        """Get existing enumeration types from database (primary - used to sync changes)"""
         query = """
         SELECT id, type_code, description
         FROM sys_enumeration_type
         """
         
         try:
-            rows = await DatabaseService.execute_query(query)
+            rows = await DatabaseService.execute_query(query, readonly=False)
             types = {}
             
             for row in rows:
@@ -99,7 +99,7 @@ class EnumerationService:
         """
         
         try:
-            rows = await DatabaseService.execute_query(query)
+            rows = await DatabaseService.execute_query(query, readonly=False)
             result = {}
             
             for row in rows:
@@ -259,18 +259,14 @@ class EnumerationService:
         
         added_values = []
         updated_values = []
+        insert_rows = []
+        update_rows = []
         
         for file_value in file_values:
             value_code = file_value['value_code']
             
             if value_code not in existing_values:
-                # Insert new value
-                query = """
-                INSERT INTO sys_enumeration_value (enumeration_type_id, value_code, value_name, numeric_value, sort_order)
-                VALUES (?, ?, ?, ?, ?)
-                """
-                
-                await cursor.execute(query, (
+                insert_rows.append((
                     type_id,
                     value_code,
                     file_value.get('value_name', ''),
@@ -286,13 +282,7 @@ class EnumerationService:
                 db_value = existing_values[value_code]
                 
                 if self._value_needs_update(file_value, db_value):
-                    query = """
-                    UPDATE sys_enumeration_value 
-                    SET value_name = ?, numeric_value = ?, sort_order = ?
-                    WHERE id = ?
-                    """
-                    
-                    await cursor.execute(query, (
+                    update_rows.append((
                         file_value.get('value_name', ''),
                         file_value.get('numeric_value'),
                         file_value.get('sort_order', 0),
@@ -302,6 +292,22 @@ class EnumerationService:
                     updated_values.append(value_code)
                     logger.info(f"Updated enumeration value: {type_code}.{value_code}")
         
+        # Значення типу записуються пакетами в тій же транзакції
+        await DatabaseService.bulk_insert(
+            "sys_enumeration_value",
+            ["enumeration_type_id", "value_code", "value_name", "numeric_value", "sort_order"],
+            insert_rows,
+            identity_column=None,
+            cursor=cursor
+        )
+        await DatabaseService.bulk_update(
+            "sys_enumeration_value",
+            ["value_name", "numeric_value", "sort_order"],
+            update_rows,
+            key_column="id",
+            cursor=cursor
+        )
+        
         # Store results
         if added_values:
             results['values_added'][type_code] = added_values
@@ -1,22 +1,105 @@
 # app/services/excel_import_service.py
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Iterator
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
+import os
+import re
 from io import BytesIO
 import aioodbc
+from pydantic import ValidationError
+from app.core.config import settings
+from app.services.table_validator import ColumnRule, TableValidator, compile_table_validator
 
 logger = logging.getLogger(__name__)
 
+_COLUMN_SEPARATORS_RE = re.compile(r'[ .\-]')
+_COLUMN_INVALID_CHARS_RE = re.compile(r'[^\w]')  # \w = isalnum() або "_"
+
+
+def _clean_value(value: Any) -> Optional[str]:
+    """Stripped string or None for empty/NaN cells"""
+    if isinstance(value, str):
+        return value.strip() or None
+    if value is None or pd.isna(value):
+        return None
+    return ExcelImportService._clean_cell(value)
+
+
+# Поелементна функція для numpy: один виклик на весь масив клітинок
+_clean_values = np.frompyfunc(_clean_value, 1, 1)
+
+
+def _clean_column_values(values: np.ndarray) -> np.ndarray:
+    """Колонка (object-масив) -> обрізані рядки, порожні/NaN -> None"""
+    try:
+        # map(str.strip) - цикл на рівні C, без Python-функції на кожну клітинку
+        cleaned = np.fromiter(map(str.strip, values), dtype=object, count=len(values))
+    except TypeError:
+        # В колонці не лише рядки (NaN, числа, дати) - поелементно
+        return _clean_values(values)
+    cleaned[np.equal(cleaned, '')] = None
+    return cleaned
+
+
+@lru_cache(maxsize=4096)
+def _clean_column_name(name: str) -> str:
+    """Header -> identifier: пробіли/дефіси/крапки -> "_", інші не алфавітно-цифрові символи видаляються"""
+    clean_name = _COLUMN_INVALID_CHARS_RE.sub('', _COLUMN_SEPARATORS_RE.sub('_', name.strip()))
+    
+    # Ensure it starts with letter or underscore
+    if clean_name and clean_name[0].isdigit():
+        clean_name = f"col_{clean_name}"
+    
+    return clean_name if clean_name else "unnamed_column"
+
+
 class ExcelImportService:
     """Service for importing data from Excel files"""
     
     def __init__(self):
         self.supported_extensions = ['.xlsx', '.xls', '.csv']
-        self.max_file_size = 50 * 1024 * 1024  # 50MB
+        # iter_excel_chunks читає їх порціями; .xls читається цілком
+        self.streaming_extensions = ['.xlsx', '.csv']
+        self.max_file_size = settings.IMPORT_MAX_FILE_SIZE
+        self.max_stream_file_size = settings.IMPORT_STREAM_MAX_FILE_SIZE
+    
+    def _open_source(self, file_content: Union[bytes, str, Path]):
+        """Accept either raw bytes or a path to a spooled upload"""
+        if isinstance(file_content, (bytes, bytearray)):
+            return BytesIO(file_content)
+        return file_content
+    
+    def _source_size(self, file_content: Union[bytes, str, Path]) -> int:
+        if isinstance(file_content, (bytes, bytearray)):
+            return len(file_content)
+        return os.path.getsize(file_content)
     
-    def validate_file(self, file_content: bytes, filename: str) -> Dict[str, Any]:
-        """Validate Excel file before processing"""
+    def max_source_size(self, filename: str, streaming: bool = False) -> int:
+        """Size limit for the file; streaming - file is imported in chunks (iter_excel_chunks)"""
+        if streaming and Path(filename).suffix.lower() in self.streaming_extensions:
+            return self.max_stream_file_size
+        return self.max_file_size
+    
+    def _check_source(self, file_content: Union[bytes, str, Path], filename: str,
+                      streaming: bool = False) -> Optional[str]:
+        """File size and extension check, returns error message"""
+        file_size = self._source_size(file_content)
+        max_size = self.max_source_size(filename, streaming)
+        if file_size > max_size:
+            return f"File too large: {file_size} bytes (max: {max_size})"
+        
+        file_ext = Path(filename).suffix.lower()
+        if file_ext not in self.supported_extensions:
+            return f"Unsupported file type: {file_ext}"
+        
+        return None
+    
+    def validate_file(self, file_content: Union[bytes, str, Path], filename: str,
+                      streaming: bool = False) -> Dict[str, Any]:
+        """Validate Excel file before processing (streaming - for chunked import)"""
         result = {
             'valid': True,
             'errors': [],
@@ -25,21 +108,17 @@ class ExcelImportService:
         }
         
         try:
-            # Check file size
-            if len(file_content) > self.max_file_size:
+            # Check file size and extension
+            error = self._check_source(file_content, filename, streaming)
+            if error:
                 result['valid'] = False
-                result['errors'].append(f"File too large: {len(file_content)} bytes (max: {self.max_file_size})")
+                result['errors'].append(error)
                 return result
             
-            # Check file extension
             file_ext = Path(filename).suffix.lower()
-            if file_ext not in self.supported_extensions:
-                result['valid'] = False
-                result['errors'].append(f"Unsupported file type: {file_ext}")
-                return result
             
             # Try to read file structure
-            file_buffer = BytesIO(file_content)
+            file_buffer = self._open_source(file_content)
             
             if file_ext == '.csv':
                 df = pd.read_csv(file_buffer, nrows=0)  # Just headers
@@ -63,7 +142,7 @@ class ExcelImportService:
         
         return result
     
-    def read_excel_file(self, file_content: bytes, filename: str, 
+    def read_excel_file(self, file_content: Union[bytes, str, Path], filename: str, 
                        sheet_name: Union[str, int] = 0, 
                        skip_rows: int = 0,
                        max_rows: Optional[int] = None) -> Dict[str, Any]:
@@ -78,7 +157,7 @@ class ExcelImportService:
         }
         
         try:
-            file_buffer = BytesIO(file_content)
+            file_buffer = self._open_source(file_content)
             file_ext = Path(filename).suffix.lower()
             
             # Read data based on file type
@@ -105,6 +184,9 @@ class ExcelImportService:
                     first_sheet = list(df.keys())[0]
                     df = df[first_sheet]
             
+            # Заголовки як у файлі (validate_file повертає їх у file_info)
+            result['source_columns'] = list(df.columns)
+            
             # Clean up data
             df = self._clean_dataframe(df)
             
@@ -122,48 +204,168 @@ class ExcelImportService:
         
         return result
     
-    def _clean_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Clean and prepare DataFrame"""
+    def parse_file(self, file_content: Union[bytes, str, Path], filename: str,
+                   sheet_name: Union[str, int, None] = 0,
+                   skip_rows: int = 0) -> Dict[str, Any]:
+        """Validate and read file in one pass: validate_file and read_excel_file results in one dict"""
         
-        # Remove completely empty rows
-        df = df.dropna(how='all')
+        result = {
+            'valid': True,
+            'errors': [],
+            'warnings': [],
+            'file_info': {},
+            'success': False,
+            'data': [],
+            'columns': [],
+            'row_count': 0
+        }
+        
+        error = self._check_source(file_content, filename)
+        if error:
+            result['valid'] = False
+            result['errors'].append(error)
+            return result
+        
+        file_ext = Path(filename).suffix.lower()
+        try:
+            source = self._open_source(file_content)
+            if file_ext != '.csv':
+                # Книга відкривається один раз - і для списку аркушів, і для даних
+                source = pd.ExcelFile(source, engine='openpyxl' if file_ext == '.xlsx' else 'xlrd')
+                result['file_info']['sheets'] = source.sheet_names
+        except Exception as e:
+            result['valid'] = False
+            result['errors'].append(f"File reading error: {str(e)}")
+            logger.error(f"File validation failed for {filename}: {e}")
+            return result
         
-        # Clean column names
-        df.columns = [self._clean_column_name(col) for col in df.columns]
+        excel_data = self.read_excel_file(source, filename, 0 if sheet_name is None else sheet_name, skip_rows)
+        if not excel_data['success']:
+            result['valid'] = False
+            result['errors'].extend(excel_data['errors'])
+            return result
         
-        # Remove duplicate column names
-        df.columns = self._handle_duplicate_columns(df.columns)
+        result['file_info']['columns'] = excel_data['source_columns']
+        result['file_info']['column_count'] = len(excel_data['source_columns'])
+        result.update(
+            success=True,
+            data=excel_data['data'],
+            columns=excel_data['columns'],
+            row_count=excel_data['row_count']
+        )
+        return result
+    
+    def iter_excel_chunks(self, file_content: Union[bytes, str, Path], filename: str,
+                          sheet_name: Union[str, int, None] = 0,
+                          skip_rows: int = 0,
+                          chunk_size: int = 5000) -> Iterator[List[Dict[str, Any]]]:
+        """Read data in fixed-size row chunks, memory depends on chunk size, not file size"""
+        
+        file_ext = Path(filename).suffix.lower()
+        
+        if file_ext == '.csv':
+            reader = pd.read_csv(
+                self._open_source(file_content),
+                skiprows=skip_rows,
+                dtype=str,
+                na_filter=False,
+                chunksize=chunk_size
+            )
+            with reader:
+                for df in reader:
+                    df = self._clean_dataframe(df)
+                    if len(df):
+                        yield df.to_dict('records')
+        elif file_ext == '.xlsx':
+            yield from self._iter_xlsx_chunks(file_content, sheet_name, skip_rows, chunk_size)
+        else:
+            # xlrd не підтримує потокове читання - читаємо повністю і ріжемо на порції
+            excel_data = self.read_excel_file(file_content, filename, 0 if sheet_name is None else sheet_name, skip_rows)
+            if not excel_data['success']:
+                raise ValueError('; '.join(excel_data['errors']))
+            yield from self.process_in_batches(excel_data['data'], chunk_size)
+    
+    def _iter_xlsx_chunks(self, file_content: Union[bytes, str, Path],
+                          sheet_name: Union[str, int, None],
+                          skip_rows: int,
+                          chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """Stream .xlsx rows using openpyxl read-only mode"""
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(self._open_source(file_content), read_only=True, data_only=True)
+        try:
+            if sheet_name is None:
+                worksheet = workbook.worksheets[0]
+            elif isinstance(sheet_name, str) and sheet_name in workbook.sheetnames:
+                worksheet = workbook[sheet_name]
+            else:
+                worksheet = workbook.worksheets[int(sheet_name)]
+            
+            rows = worksheet.iter_rows(values_only=True)
+            for _ in range(skip_rows):
+                next(rows, None)
+            
+            header = next(rows, None)
+            if header is None:
+                return
+            # Порожні заголовки називаємо так само, як pandas ("Unnamed: N")
+            header = [f"Unnamed: {idx}" if col is None else col for idx, col in enumerate(header)]
+            columns = self._handle_duplicate_columns([self._clean_column_name(col) for col in header])
+            
+            chunk = []
+            for values in rows:
+                record = dict.fromkeys(columns)
+                is_empty = True
+                for col, value in zip(columns, values):
+                    value = self._clean_cell(value)
+                    if value is not None:
+                        record[col] = value
+                        is_empty = False
+                if is_empty:
+                    continue
+                
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            
+            if chunk:
+                yield chunk
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _clean_cell(value: Any) -> Optional[str]:
+        """Convert cell value to stripped string the same way read_excel(dtype=str) does"""
+        if value is None:
+            return None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        value = str(value).strip()
+        return value if value != '' else None
+    
+    def _clean_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Clean and prepare DataFrame"""
+        
+        # Clean column names and remove duplicates
+        columns = self._handle_duplicate_columns([self._clean_column_name(col) for col in df.columns])
         
-        # Clean cell values
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                df[col] = df[col].astype(str).str.strip()
-                # Replace empty strings with None
-                df[col] = df[col].replace('', None)
+        # Кожна колонка - один прохід strip + порожнє/NaN -> None (замість кількох копій через astype/replace)
+        data = [_clean_column_values(df.iloc[:, idx].to_numpy(dtype=object)) for idx in range(df.shape[1])]
+        cleaned = pd.DataFrame(dict(enumerate(data)), index=df.index, dtype=object)
+        cleaned.columns = columns
         
-        return df
+        # Remove completely empty rows
+        non_empty = np.zeros(len(cleaned), dtype=bool)
+        for values in data:
+            non_empty |= np.not_equal(values, None)
+        return cleaned if non_empty.all() else cleaned[non_empty]
     
     def _clean_column_name(self, column_name: str) -> str:
         """Clean column name for processing"""
         if pd.isna(column_name):
             return "unnamed_column"
-        
-        # Convert to string and clean
-        clean_name = str(column_name).strip()
-        
-        # Replace problematic characters
-        clean_name = clean_name.replace(' ', '_')
-        clean_name = clean_name.replace('-', '_')
-        clean_name = clean_name.replace('.', '_')
-        
-        # Remove non-alphanumeric characters except underscore
-        clean_name = ''.join(c for c in clean_name if c.isalnum() or c == '_')
-        
-        # Ensure it starts with letter or underscore
-        if clean_name and clean_name[0].isdigit():
-            clean_name = f"col_{clean_name}"
-        
-        return clean_name if clean_name else "unnamed_column"
+        return _clean_column_name(str(column_name))
     
     def _handle_duplicate_columns(self, columns: List[str]) -> List[str]:
         """Handle duplicate column names by adding suffixes"""
@@ -207,8 +409,8 @@ class ExcelImportService:
         
         return mapping
     
-    def validate_data(self, data: List[Dict], table_schema: Dict, column_mapping: Dict) -> Dict[str, Any]:
-        """Validate data against table schema"""
+    def validate_data(self, data: List[Dict], table_schema: Union[Dict, TableValidator], column_mapping: Dict) -> Dict[str, Any]:
+        """Validate data against table schema (schema dict or compiled TableValidator)"""
         
         result = {
             'valid': True,
@@ -220,41 +422,18 @@ class ExcelImportService:
         }
         
         try:
-            schema_columns = table_schema.get('columns', {})
-            required_fields = [col for col, def_ in schema_columns.items() if not def_.get('nullable', True)]
+            validator = table_schema if isinstance(table_schema, TableValidator) else compile_table_validator('', table_schema)
             
-            for row_idx, row in enumerate(data):
-                row_errors = []
-                
-                # # Check required fields
-                # for required_field in required_fields:
-                #     mapped_excel_col = None
-                #     for excel_col, table_col in column_mapping.items():
-                #         if table_col == required_field:
-                #             mapped_excel_col = excel_col
-                #             break
-                    
-                #     if mapped_excel_col is None:
-                #         row_errors.append(f"Required field '{required_field}' not mapped")
-                #     elif not row.get(mapped_excel_col) or str(row.get(mapped_excel_col)).strip() == '':
-                #         row_errors.append(f"Required field '{required_field}' is empty")
-                
-                # Validate data types
-                for excel_col, table_col in column_mapping.items():
-                    if table_col and table_col in schema_columns:
-                        value = row.get(excel_col)
-                        if value is not None and str(value).strip() != '':
-                            validation_error = self._validate_field_type(value, schema_columns[table_col])
-                            if validation_error:
-                                row_errors.append(f"Field '{table_col}': {validation_error}")
-                
-                if row_errors:
-                    result['invalid_rows'] += 1
-                    result['row_errors'][row_idx + 1] = row_errors  # 1-based row numbers
-                    result['errors'].extend([f"Row {row_idx + 1}: {error}" for error in row_errors])
-                else:
-                    result['valid_rows'] += 1
+            # Колонки перевіряються цілком масками, підозрілі рядки - тими ж правилами pydantic, що й при записі
+            row_errors = validator.column_errors(data, column_mapping)
+            
+            for row_idx in sorted(row_errors):
+                errors = row_errors[row_idx]
+                result['row_errors'][row_idx + 1] = errors  # 1-based row numbers
+                result['errors'].extend([f"Row {row_idx + 1}: {error}" for error in errors])
             
+            result['invalid_rows'] = len(row_errors)
+            result['valid_rows'] = len(data) - len(row_errors)
             if result['invalid_rows'] > 0:
                 result['valid'] = False
                 
@@ -267,35 +446,16 @@ class ExcelImportService:
     
     def _validate_field_type(self, value: Any, field_def: Dict) -> Optional[str]:
         """Validate single field against its definition"""
-        
-        field_type = field_def.get('type', '').upper()
-        str_value = str(value).strip()
-        
+        rule = ColumnRule.compile('', field_def)
         try:
-            if 'INT' in field_type or 'BIGINT' in field_type:
-                int(str_value)
-            elif 'DECIMAL' in field_type or 'FLOAT' in field_type:
-                float(str_value)
-            elif 'BIT' in field_type:
-                if str_value.lower() not in ['0', '1', 'true', 'false', 'yes', 'no']:
-                    return f"Invalid boolean value: {str_value}"
-            elif 'DATE' in field_type:
-                # Basic date validation - could be enhanced
-                pd.to_datetime(str_value)
-            elif 'NVARCHAR' in field_type:
-                # Check length if specified
-                if '(' in field_type:
-                    max_length = int(field_type.split('(')[1].split(')')[0])
-                    if len(str_value) > max_length:
-                        return f"Value too long: {len(str_value)} > {max_length}"
-                        
-        except (ValueError, TypeError):
-            return f"Invalid {field_type} value: {str_value}"
-        
+            rule.validate(value)
+        except ValidationError as e:
+            return rule.error_message(e.errors(include_url=False)[0]['type'], value)
         return None
     
-    def transform_data(self, data: List[Dict], column_mapping: Dict, transform_rules: Dict = None) -> List[Dict]:
-        """Transform data according to column mapping and rules"""
+    def transform_data(self, data: List[Dict], column_mapping: Dict, transform_rules: Dict = None,
+                       validator: Optional[TableValidator] = None) -> List[Dict]:
+        """Transform data according to column mapping and rules, values are coerced to column types if validator given"""
         
         if transform_rules is None:
             transform_rules = {}
@@ -323,6 +483,18 @@ class ExcelImportService:
             
             transformed_data.append(transformed_row)
         
+        if validator is not None:
+            # Приведення типів - тим самим pydantic-валідатором, що й перевірка та запис
+            columns = list(dict.fromkeys(table_col for table_col in column_mapping.values()
+                                         if table_col in validator.columns))
+            items = [{col: row[col] for col in columns if col in row} for row in transformed_data]
+            _, values, row_errors = validator.validate_rows(items, columns)
+            if row_errors:
+                row_idx = min(row_errors)
+                raise ValueError(f"Row {row_idx + 1}: {'; '.join(row_errors[row_idx])}")
+            for row, row_values in zip(transformed_data, values):
+                row.update(zip(columns, row_values))
+        
         return transformed_data
     
     def _apply_transform_rule(self, value: Any, rule: Dict) -> Any:
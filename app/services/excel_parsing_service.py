@@ -0,0 +1,117 @@
+# app/services/excel_parsing_service.py
+from typing import Dict, Any, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services.excel_import_service import ExcelImportService
+from app.services.parsed_upload_cache import parsed_upload_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ParserBusyError(Exception):
+    """Parsing queue is full"""
+
+
+# Функції верхнього рівня - виконуються в дочірніх процесах (мають бути picklable)
+def _validate_file(file_content: Union[bytes, str], filename: str, streaming: bool) -> Dict[str, Any]:
+    return ExcelImportService().validate_file(file_content, filename, streaming)
+
+
+def _read_excel_file(file_content: Union[bytes, str], filename: str,
+                     sheet_name: Union[str, int, None], skip_rows: int,
+                     max_rows: Optional[int]) -> Dict[str, Any]:
+    return ExcelImportService().read_excel_file(file_content, filename, sheet_name, skip_rows, max_rows)
+
+
+def _parse_file(file_content: Union[bytes, str], filename: str,
+                sheet_name: Union[str, int, None], skip_rows: int) -> Dict[str, Any]:
+    return ExcelImportService().parse_file(file_content, filename, sheet_name, skip_rows)
+
+
+class ExcelParsingService:
+    """Runs pandas/openpyxl parsing in a bounded process pool, off the event loop"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_workers = max_workers or settings.IMPORT_PARSER_WORKERS
+        self.max_queue = settings.IMPORT_PARSER_MAX_QUEUE if max_queue is None else max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Jobs running or waiting in this worker process"""
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Пул створюється ліниво - вже в процесі воркера, а не в master (preload_app)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"Excel parsing pool started with {self.max_workers} workers")
+        return self._executor
+
+    async def _submit(self, func, *args):
+        if self._pending >= self.max_workers + self.max_queue:
+            raise ParserBusyError(f"Excel parsing queue is full ({self._pending} pending)")
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            # Дочірній процес впав (наприклад OOM) - наступний запит створить новий пул
+            logger.error("Excel parsing pool is broken, restarting")
+            self.shutdown()
+            raise
+        finally:
+            self._pending -= 1
+
+    async def validate_file(self, file_content: Union[bytes, str, Path], filename: str,
+                            streaming: bool = False) -> Dict[str, Any]:
+        """Validate file in the parsing pool"""
+        return await self._submit(_validate_file, self._portable(file_content), filename, streaming)
+
+    async def read_excel_file(self, file_content: Union[bytes, str, Path], filename: str,
+                              sheet_name: Union[str, int, None] = 0,
+                              skip_rows: int = 0,
+                              max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Read file in the parsing pool"""
+        return await self._submit(
+            _read_excel_file, self._portable(file_content), filename, sheet_name, skip_rows, max_rows
+        )
+
+    async def parse_upload(self, file_content: Union[bytes, str, Path], filename: str,
+                           sheet_name: Union[str, int, None] = 0,
+                           skip_rows: int = 0,
+                           content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Validate and read file once; with content_hash the result is reused from parsed upload cache.
+
+        Returned data may be shared with the cache - rows must not be modified.
+        """
+        cache_key = parsed_upload_cache.make_key(content_hash, filename, sheet_name, skip_rows) if content_hash else None
+        if cache_key:
+            parsed = await asyncio.to_thread(parsed_upload_cache.get, cache_key)
+            if parsed is not None:
+                return parsed
+
+        parsed = await self._submit(_parse_file, self._portable(file_content), filename, sheet_name, skip_rows)
+        if cache_key and parsed['valid'] and parsed['success']:
+            await asyncio.to_thread(parsed_upload_cache.put, cache_key, parsed)
+        return parsed
+
+    def _portable(self, file_content: Union[bytes, str, Path]) -> Union[bytes, str]:
+        # Шлях до файлу дешевше передати в інший процес, ніж байти
+        return str(file_content) if isinstance(file_content, Path) else file_content
+
+    def shutdown(self):
+        """Stop pool processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+excel_parser = ExcelParsingService()
@@ -0,0 +1,305 @@
+# app/services/import_job_service.py
+from dataclasses import dataclass, field, asdict
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+from pathlib import Path
+import asyncio
+import json
+import sqlite3
+import time
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+JSON_FIELDS = ("payload", "stats")
+
+
+@dataclass
+class ImportJob:
+    job_id: str
+    import_type: str
+    table_name: str
+    user_id: Optional[int] = None
+    filename: Optional[str] = None
+    payload: Dict[str, Any] = field(default_factory=dict)
+    state: str = JOB_QUEUED
+    rows_parsed: int = 0
+    rows_written: int = 0
+    rows_rejected: int = 0
+    parse_seconds: float = 0.0
+    write_seconds: float = 0.0
+    stats: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+    worker_id: Optional[str] = None
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    heartbeat_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    version: int = 0
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Written rows per second"""
+        elapsed = self.elapsed_seconds
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        # payload містить шлях до файлу на сервері - назовні не віддаємо
+        data.pop('payload')
+        data['elapsed_seconds'] = round(self.elapsed_seconds, 3)
+        data['throughput_rows_per_sec'] = round(self.throughput, 1)
+        return data
+
+
+class ImportJobRegistry:
+    """Durable import job queue and progress registry backed by a local SQLite file.
+
+    Shared by API workers (enqueue, status) and the import worker process (claim, progress).
+    SQLite calls block (up to the lock timeout), so the public methods run them in a thread.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_finished: int = 200):
+        self.db_path = Path(db_path or settings.IMPORT_QUEUE_PATH)
+        self.max_finished = max_finished
+        self._schema_ready = False
+
+    @contextmanager
+    def _connect(self):
+        if not self._schema_ready:
+            self._init_schema()
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            # WAL - читачі (API) не блокують записувача (воркер)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS import_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    import_type TEXT NOT NULL,
+                    table_name TEXT NOT NULL,
+                    user_id INTEGER,
+                    filename TEXT,
+                    payload TEXT NOT NULL DEFAULT '{}',
+                    state TEXT NOT NULL,
+                    rows_parsed INTEGER NOT NULL DEFAULT 0,
+                    rows_written INTEGER NOT NULL DEFAULT 0,
+                    rows_rejected INTEGER NOT NULL DEFAULT 0,
+                    parse_seconds REAL NOT NULL DEFAULT 0,
+                    write_seconds REAL NOT NULL DEFAULT 0,
+                    stats TEXT NOT NULL DEFAULT '{}',
+                    error TEXT,
+                    worker_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_import_jobs_state ON import_jobs (state, created_at)")
+        finally:
+            conn.close()
+        self._schema_ready = True
+
+    async def create(self, job_id: str, import_type: str, table_name: str,
+                     user_id: Optional[int] = None, filename: Optional[str] = None,
+                     payload: Optional[Dict[str, Any]] = None) -> ImportJob:
+        """Put a new job into the queue"""
+        return await asyncio.to_thread(self._create, job_id, import_type, table_name, user_id, filename, payload)
+
+    async def get(self, job_id: str) -> Optional[ImportJob]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def list(self, user_id: Optional[int] = None) -> List[ImportJob]:
+        return await asyncio.to_thread(self._list, user_id)
+
+    async def claim(self, worker_id: str, job_id: Optional[str] = None) -> Optional[ImportJob]:
+        """Atomically take the oldest queued job (or a specific one) for execution"""
+        return await asyncio.to_thread(self._claim, worker_id, job_id)
+
+    async def heartbeat(self, job_ids: List[str]):
+        await asyncio.to_thread(self._heartbeat, job_ids)
+
+    async def requeue_stale(self, timeout: float, max_attempts: int) -> int:
+        """Return jobs of dead workers to the queue (or fail them after max_attempts)"""
+        return await asyncio.to_thread(self._requeue_stale, timeout, max_attempts)
+
+    async def add_progress(self, job_id: str, rows_parsed: int = 0, rows_written: int = 0, rows_rejected: int = 0,
+                           parse_seconds: float = 0.0, write_seconds: float = 0.0, stats: Dict[str, int] = None):
+        await asyncio.to_thread(self._add_progress, job_id, rows_parsed, rows_written, rows_rejected,
+                                parse_seconds, write_seconds, stats)
+
+    def _row_to_job(self, row: sqlite3.Row) -> ImportJob:
+        data = dict(row)
+        for name in JSON_FIELDS:
+            data[name] = json.loads(data[name] or '{}')
+        return ImportJob(**data)
+
+    def _create(self, job_id: str, import_type: str, table_name: str,
+                user_id: Optional[int] = None, filename: Optional[str] = None,
+                payload: Optional[Dict[str, Any]] = None) -> ImportJob:
+        job = ImportJob(job_id=job_id, import_type=import_type, table_name=table_name,
+                        user_id=user_id, filename=filename, payload=payload or {})
+        data = asdict(job)
+        for name in JSON_FIELDS:
+            data[name] = json.dumps(data[name], default=str)
+        columns = ', '.join(data.keys())
+        placeholders = ', '.join(['?'] * len(data))
+        with self._connect() as conn:
+            conn.execute(f"INSERT INTO import_jobs ({columns}) VALUES ({placeholders})", tuple(data.values()))
+        self._evict_finished()
+        return job
+
+    def _get(self, job_id: str) -> Optional[ImportJob]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM import_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def _list(self, user_id: Optional[int] = None) -> List[ImportJob]:
+        with self._connect() as conn:
+            if user_id is None:
+                rows = conn.execute("SELECT * FROM import_jobs ORDER BY created_at DESC").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM import_jobs WHERE user_id = ? ORDER BY created_at DESC", (user_id,)
+                ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def _claim(self, worker_id: str, job_id: Optional[str] = None) -> Optional[ImportJob]:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if job_id is None:
+                    row = conn.execute(
+                        "SELECT job_id FROM import_jobs WHERE state = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+                    ).fetchone()
+                else:
+                    row = conn.execute(
+                        "SELECT job_id FROM import_jobs WHERE state = ? AND job_id = ?", (JOB_QUEUED, job_id)
+                    ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE import_jobs SET state = ?, worker_id = ?, started_at = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1, version = version + 1 WHERE job_id = ?",
+                    (JOB_RUNNING, worker_id, now, now, row['job_id'])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._get(row['job_id'])
+
+    def _heartbeat(self, job_ids: List[str]):
+        if not job_ids:
+            return
+        placeholders = ', '.join(['?'] * len(job_ids))
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE import_jobs SET heartbeat_at = ? WHERE state = ? AND job_id IN ({placeholders})",
+                (time.time(), JOB_RUNNING, *job_ids)
+            )
+
+    def _requeue_stale(self, timeout: float, max_attempts: int) -> int:
+        deadline = time.time() - timeout
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE import_jobs SET state = ?, error = 'Worker lost', finished_at = ?, version = version + 1 "
+                    "WHERE state = ? AND heartbeat_at < ? AND attempts >= ?",
+                    (JOB_FAILED, time.time(), JOB_RUNNING, deadline, max_attempts)
+                )
+                # Імпорт ідемпотентний (upsert по external_id) - перезапускаємо з початку файлу
+                cursor = conn.execute(
+                    "UPDATE import_jobs SET state = ?, worker_id = NULL, rows_parsed = 0, rows_written = 0, "
+                    "rows_rejected = 0, parse_seconds = 0, write_seconds = 0, stats = '{}', version = version + 1 "
+                    "WHERE state = ? AND heartbeat_at < ?",
+                    (JOB_QUEUED, JOB_RUNNING, deadline)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if cursor.rowcount:
+            logger.warning(f"Requeued {cursor.rowcount} stale import jobs")
+        return cursor.rowcount
+
+    def _add_progress(self, job_id: str, rows_parsed: int = 0, rows_written: int = 0, rows_rejected: int = 0,
+                      parse_seconds: float = 0.0, write_seconds: float = 0.0, stats: Dict[str, int] = None):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT stats FROM import_jobs WHERE job_id = ?", (job_id,)).fetchone()
+                merged = json.loads(row['stats'] or '{}') if row else {}
+                for key, value in (stats or {}).items():
+                    merged[key] = merged.get(key, 0) + value
+                conn.execute(
+                    "UPDATE import_jobs SET rows_parsed = rows_parsed + ?, rows_written = rows_written + ?, "
+                    "rows_rejected = rows_rejected + ?, parse_seconds = parse_seconds + ?, "
+                    "write_seconds = write_seconds + ?, stats = ?, heartbeat_at = ?, version = version + 1 "
+                    "WHERE job_id = ?",
+                    (rows_parsed, rows_written, rows_rejected, parse_seconds, write_seconds,
+                     json.dumps(merged), time.time(), job_id)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def complete(self, job_id: str):
+        await asyncio.to_thread(self._finish, job_id, JOB_COMPLETED)
+        job = await self.get(job_id)
+        if job:
+            logger.info(
+                f"Import job {job_id} completed: {job.rows_written} rows in {job.elapsed_seconds:.1f}s "
+                f"(parse {job.parse_seconds:.1f}s, write {job.write_seconds:.1f}s, {job.throughput:.0f} rows/s)"
+            )
+
+    async def fail(self, job_id: str, error: str):
+        await asyncio.to_thread(self._finish, job_id, JOB_FAILED, error)
+
+    def _finish(self, job_id: str, state: str, error: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE import_jobs SET state = ?, error = ?, finished_at = ?, version = version + 1 WHERE job_id = ?",
+                (state, error, time.time(), job_id)
+            )
+
+    def _evict_finished(self):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM import_jobs WHERE job_id IN ("
+                "SELECT job_id FROM import_jobs WHERE state IN (?, ?) ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (*FINISHED_STATES, self.max_finished)
+            )
+
+
+import_job_registry = ImportJobRegistry()
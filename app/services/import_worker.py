@@ -0,0 +1,181 @@
+# app/services/import_worker.py
+from typing import Dict, Iterator, List, Optional
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from app.core.config import settings
+from app.db.database import db_manager
+from app.models.models_catalog.cat_products_brands import Cat_ProductBrand
+from app.services.excel_import_service import ExcelImportService
+from app.services.import_job_service import ImportJob, ImportJobRegistry, import_job_registry
+from app.services.parsed_upload_cache import parsed_upload_cache
+
+logger = logging.getLogger(__name__)
+
+# Таблиця -> клас довідника з import_from_rows
+IMPORTERS = {
+    "cat_products_brands": Cat_ProductBrand,
+}
+
+excel_service = ExcelImportService()
+
+
+async def run_import_job(job: ImportJob, registry: ImportJobRegistry = import_job_registry):
+    """Stream the spooled file in chunks into the table importer, reporting progress"""
+    payload = job.payload
+    file_path = payload.get('file_path')
+    try:
+        logger.info(f"Starting import job {job.job_id} for table {job.table_name}")
+        importer = IMPORTERS.get(job.table_name)
+        if importer is None:
+            raise ValueError(f"No importer registered for table '{job.table_name}'")
+
+        chunks = await _iter_job_chunks(job, file_path)
+        while True:
+            # openpyxl/pandas парсять порцію в потоці, щоб не блокувати event loop
+            parse_started = time.perf_counter()
+            rows = await asyncio.to_thread(next, chunks, None)
+            parse_seconds = time.perf_counter() - parse_started
+            if rows is None:
+                await registry.add_progress(job.job_id, parse_seconds=parse_seconds)
+                break
+
+            write_started = time.perf_counter()
+            result = await importer.import_from_rows(
+                rows, payload.get('source_id'), job.user_id, bulk=True, batch_size=payload.get('batch_size', 1000)
+            )
+            await registry.add_progress(
+                job.job_id,
+                rows_parsed=len(rows),
+                rows_written=result['inserted'] + result['updated'] + result['unchanged'],
+                rows_rejected=result['rejected'],
+                parse_seconds=parse_seconds,
+                write_seconds=time.perf_counter() - write_started,
+                stats={key: result[key] for key in ('inserted', 'updated', 'unchanged', 'duplicates')}
+            )
+
+        await registry.complete(job.job_id)
+        if payload.get('parse_cache_key'):
+            await asyncio.to_thread(parsed_upload_cache.discard, payload['parse_cache_key'])
+
+    except asyncio.CancelledError:
+        # Воркер зупиняється - задача повернеться в чергу після heartbeat timeout, файл потрібен
+        logger.warning(f"Import job {job.job_id} interrupted")
+        raise
+    except Exception as e:
+        logger.error(f"Error in import job {job.job_id}: {e}")
+        await registry.fail(job.job_id, str(e))
+
+    _remove_spool_file(file_path)
+
+
+async def _iter_job_chunks(job: ImportJob, file_path: Optional[str]) -> Iterator[List[Dict]]:
+    """Row chunks from parsed upload cache (file already parsed by preview) or streamed from the file"""
+    payload = job.payload
+    cache_key = payload.get('parse_cache_key')
+    parsed = await asyncio.to_thread(parsed_upload_cache.get, cache_key) if cache_key else None
+    if parsed is None:
+        return excel_service.iter_excel_chunks(
+            file_path, job.filename, payload.get('sheet_name'), chunk_size=settings.IMPORT_CHUNK_SIZE
+        )
+
+    logger.info(f"Import job {job.job_id}: using cached parse of {job.filename}")
+    # Рядки кешу спільні - імпортер змінює рядки порції, тому копіюємо
+    return ([dict(row) for row in chunk]
+            for chunk in excel_service.process_in_batches(parsed['data'], settings.IMPORT_CHUNK_SIZE))
+
+
+def _remove_spool_file(file_path: Optional[str]):
+    if file_path and os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            logger.warning(f"Could not remove spooled upload {file_path}: {e}")
+
+
+class ImportWorker:
+    """Consumes the durable import queue in a dedicated process or inside the API process"""
+
+    def __init__(self, concurrency: Optional[int] = None, poll_interval: Optional[float] = None,
+                 registry: ImportJobRegistry = import_job_registry, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency or settings.IMPORT_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.IMPORT_WORKER_POLL_INTERVAL
+        self.registry = registry
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def stop(self):
+        """Stop claiming new jobs, let running ones finish"""
+        self._stopping = True
+        self.notify()
+
+    def notify(self):
+        """New job queued - claim it without waiting for the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Import worker {self.worker_id} started (concurrency {self.concurrency})")
+        try:
+            while not self._stopping:
+                try:
+                    await self.registry.requeue_stale(settings.IMPORT_JOB_STALE_TIMEOUT, settings.IMPORT_JOB_MAX_ATTEMPTS)
+                    await self._claim_jobs()
+                except Exception as e:
+                    logger.warning(f"Import worker {self.worker_id} could not poll the queue: {e}")
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+            if self._running:
+                logger.info(f"Waiting for {len(self._running)} running import jobs")
+                await asyncio.wait(list(self._running.values()), timeout=settings.IMPORT_WORKER_SHUTDOWN_TIMEOUT)
+        finally:
+            for task in self._running.values():
+                task.cancel()
+            heartbeat_task.cancel()
+            logger.info(f"Import worker {self.worker_id} stopped")
+
+    async def _claim_jobs(self):
+        while len(self._running) < self.concurrency and not self._stopping:
+            job = await self.registry.claim(self.worker_id)
+            if job is None:
+                return
+            task = asyncio.create_task(run_import_job(job, self.registry))
+            self._running[job.job_id] = task
+            task.add_done_callback(lambda _task, job_id=job.job_id: self._running.pop(job_id, None))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.IMPORT_JOB_HEARTBEAT_INTERVAL)
+            try:
+                await self.registry.heartbeat(list(self._running.keys()))
+            except Exception as e:
+                logger.warning(f"Import worker heartbeat failed: {e}")
+
+
+# Виконує задачі в процесі API (IMPORT_USE_WORKER = False); створюється в lifespan - вже в процесі
+# воркера сервера (з preload_app модуль імпортується в майстрі, і PID був би спільний)
+api_import_worker: Optional[ImportWorker] = None
+
+
+def create_api_import_worker() -> ImportWorker:
+    global api_import_worker
+    api_import_worker = ImportWorker(worker_id=f"api:{socket.gethostname()}:{os.getpid()}")
+    return api_import_worker
+
+
+def notify_api_import_worker():
+    """New job queued - wake the API process worker"""
+    if api_import_worker is not None:
+        api_import_worker.notify()
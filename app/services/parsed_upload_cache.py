@@ -0,0 +1,210 @@
+# app/services/parsed_upload_cache.py
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Union
+from pathlib import Path
+import hashlib
+import os
+import pickle
+import threading
+import time
+import logging
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Збільшити при зміні формату результату розбору або очищення даних
+PARSE_CACHE_VERSION = 1
+
+
+class ParsedUploadCache:
+    """LRU cache of parsed uploads keyed by content SHA-256 and read options.
+
+    Entries live in process memory (bounded by total rows) and on disk (bounded by bytes),
+    the disk part is shared by server workers and the import worker. Entries not used for
+    ttl seconds expire; an import job removes the entry it used when it completes.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_disk_bytes: Optional[int] = None,
+                 max_memory_rows: Optional[int] = None, max_entry_rows: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        cache_dir = settings.IMPORT_PARSE_CACHE_DIR if cache_dir is None else cache_dir
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_disk_bytes = settings.IMPORT_PARSE_CACHE_MAX_BYTES if max_disk_bytes is None else max_disk_bytes
+        self.max_memory_rows = settings.IMPORT_PARSE_CACHE_MEMORY_ROWS if max_memory_rows is None else max_memory_rows
+        self.max_entry_rows = settings.IMPORT_PARSE_CACHE_MAX_ROWS if max_entry_rows is None else max_entry_rows
+        self.ttl = settings.IMPORT_PARSE_CACHE_TTL_SECONDS if ttl is None else ttl
+        # key -> (час останнього використання, результат розбору)
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._memory_rows = 0
+        # Оцінка розміру теки: повний перегляд лише при перевищенні ліміту або раз на ttl (None - ще не рахували)
+        self._disk_bytes: Optional[int] = None
+        self._scanned_at = 0.0
+        self._dir_ready = False
+        # Доступ з потоків asyncio.to_thread
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(content_hash: str, filename: str, sheet_name: Union[str, int, None] = 0, skip_rows: int = 0) -> str:
+        """Same content read with the same options -> same key"""
+        # sheet_name=None і 0 - обидва перший аркуш
+        sheet_name = 0 if sheet_name is None else sheet_name
+        options = f"{PARSE_CACHE_VERSION}:{content_hash}:{Path(filename or '').suffix.lower()}:{sheet_name!r}:{skip_rows}"
+        return hashlib.sha256(options.encode()).hexdigest()
+
+    def _entry_rows(self, parsed: Dict[str, Any]) -> int:
+        return parsed.get('row_count', 0) + 1
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        return self.cache_dir / f"{key}.pickle" if self.cache_dir else None
+
+    def _expired(self, used_at: float) -> bool:
+        return time.time() - used_at > self.ttl
+
+    def contains(self, key: str) -> bool:
+        """Cheap check without loading the entry from disk"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                return True
+        path = self._disk_path(key)
+        try:
+            return path is not None and not self._expired(path.stat().st_mtime)
+        except FileNotFoundError:
+            return False
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Parsed upload or None. Returned data is shared - callers must not modify rows"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry[0]):
+                self._forget(key)
+            elif entry is not None:
+                self._memory[key] = (time.time(), entry[1])
+                self._memory.move_to_end(key)
+                metrics.increment("import.parse_cache.memory_hits")
+                return entry[1]
+
+        parsed = self._load(key)
+        if parsed is None:
+            metrics.increment("import.parse_cache.misses")
+            return None
+        metrics.increment("import.parse_cache.disk_hits")
+        self._remember(key, parsed)
+        return parsed
+
+    def put(self, key: str, parsed: Dict[str, Any]):
+        """Store parsed upload; files with too many rows are not cached"""
+        if parsed.get('row_count', 0) > self.max_entry_rows:
+            return
+        self._remember(key, parsed)
+        self._store(key, parsed)
+
+    def discard(self, key: str):
+        """Remove the entry (the import job that used it has completed)"""
+        with self._lock:
+            self._forget(key)
+        path = self._disk_path(key)
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+    def _forget(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_rows -= self._entry_rows(entry[1])
+
+    def _remember(self, key: str, parsed: Dict[str, Any]):
+        rows = self._entry_rows(parsed)
+        if rows > self.max_memory_rows:
+            return
+        with self._lock:
+            self._forget(key)
+            self._memory[key] = (time.time(), parsed)
+            self._memory_rows += rows
+            while self._memory_rows > self.max_memory_rows:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_rows -= self._entry_rows(evicted)
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        if path is None:
+            return None
+        try:
+            if self._expired(path.stat().st_mtime):
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, 'rb') as f:
+                parsed = pickle.load(f)
+            # mtime - час останнього використання для LRU
+            os.utime(path)
+            return parsed
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Parsed upload cache entry {path} is unreadable, removing: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def _store(self, key: str, parsed: Dict[str, Any]):
+        path = self._disk_path(key)
+        if path is None:
+            return
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            self._ensure_dir()
+            # Записи розпаковуються через pickle - файли і тека доступні лише власнику процесу
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            size = path.stat().st_size
+        except Exception as e:
+            logger.warning(f"Could not write parsed upload cache entry {path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+            needs_scan = (self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+                          or self._expired(self._scanned_at))
+        if needs_scan:
+            self._evict_disk()
+
+    def _ensure_dir(self):
+        if self._dir_ready:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+        # Тека могла бути створена раніше з ширшими правами
+        os.chmod(self.cache_dir, 0o700)
+        self._dir_ready = True
+
+    def _evict_disk(self):
+        """Remove expired entries, then least recently used ones until the cache fits max_disk_bytes"""
+        entries = []
+        for path in self.cache_dir.glob("*.pickle"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if self._expired(stat.st_mtime):
+                path.unlink(missing_ok=True)
+                metrics.increment("import.parse_cache.expired")
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            metrics.increment("import.parse_cache.evictions")
+
+        # Записи інших процесів оцінка не враховує - уточнюється при кожному перегляді
+        with self._lock:
+            self._disk_bytes = total
+            self._scanned_at = time.time()
+
+
+parsed_upload_cache = ParsedUploadCache()
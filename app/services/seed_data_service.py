@@ -2,6 +2,7 @@ from __future__ import annotations  # Для підтримки нових ти
 import logging
 from typing import Dict, Any, List, Optional
 from app.services.database_service import DatabaseService
+from app.core.security import hash_password
 import hashlib
 
 # app/services/seed_data_service.py
@@ -50,7 +51,7 @@ class SeedDataService:
                 "name": "Admin",
                 "full_name": "System Administrator",
                 "email": "",
-                "password_hash": self._hash_password("admin"),
+                "password_hash": hash_password("admin"),
                 "is_active": True,
                 "is_admin": True,
                 "_created_at": "GETDATE()",
@@ -60,18 +61,6 @@ class SeedDataService:
             await self._insert_user(admin_data)
             # logger.info("Created default administrator")
     
-    def _hash_password(self, password: str) -> str:
-        """Захешувати пароль використовуючи bcrypt"""
-        try:
-            import bcrypt
-            salt = bcrypt.gensalt()
-            hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-            return hashed.decode('utf-8')
-        except ImportError:
-            # Fallback на простий хеш якщо bcrypt не встановлений
-            import hashlib
-            return hashlib.sha256(password.encode()).hexdigest()
-    
     async def _insert_user(self, user_data: dict):
         """Вставити користувача в БД"""
         query = """
@@ -125,18 +114,8 @@ class SeedDataService:
                 }
             ]
             
-            for product_type in product_types:
-                await self._insert_product_type(product_type)
-    
-    async def _insert_product_type(self, product_type_data: dict):
-        """Вставити тип продукції в БД"""
-        query = """
-        INSERT INTO cat_products_type (name, type_code, _created_by, _created_at)
-        VALUES (?, ?, ?, GETDATE())
-        """
-        
-        await DatabaseService.execute_non_query(query, (
-            product_type_data["_name"],
-            product_type_data["type_code"], 
-            product_type_data["_created_by"]
-        ))
\ No newline at end of file
+            await DatabaseService.bulk_insert(
+                "cat_products_type",
+                ["name", "type_code", "_created_by"],
+                [(t["_name"], t["type_code"], t["_created_by"]) for t in product_types]
+            )
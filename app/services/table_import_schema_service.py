@@ -2,20 +2,26 @@
 from typing import Dict, List, Any, Optional
 import logging
 from app.db.schema_manager import SchemaManager
+from app.services.table_validator import ColumnRule, TableValidator, compile_table_validator
 
 logger = logging.getLogger(__name__)
 
+# Правила колонки, якої немає в схемі
+_DEFAULT_COLUMN_RULE = ColumnRule.compile('', {'type': 'NVARCHAR(255)'})
+
 class TableImportSchemaService:
     """Service for working with table schemas for import operations"""
     
     def __init__(self):
         self.schema_manager = SchemaManager()
         self._schemas_loaded = False
+        self._validators: Dict[str, TableValidator] = {}
     
     def _ensure_schemas_loaded(self):
         """Ensure schemas are loaded"""
         if not self._schemas_loaded:
             self.schema_manager.load_all_schemas()
+            self._validators.clear()
             self._schemas_loaded = True
     
     def get_table_schema(self, table_name: str) -> Optional[Dict[str, Any]]:
@@ -33,72 +39,54 @@ class TableImportSchemaService:
         
         return schema.get('columns', {})
     
+    def get_table_validator(self, table_name: str) -> TableValidator:
+        """Compiled column rules for table, built once per table and reused by validation, transform and bulk insert"""
+        validator = self._validators.get(table_name)
+        if validator is None:
+            schema = self.get_table_schema(table_name)
+            if not schema:
+                # Невідомі таблиці не кешуємо - назва приходить із запиту
+                return TableValidator(table_name)
+            validator = self._validators[table_name] = compile_table_validator(table_name, schema)
+        return validator
+    
+    def _get_column_rule(self, table_name: str, column_name: str) -> Optional[ColumnRule]:
+        return self.get_table_validator(table_name).columns.get(column_name)
+    
     def get_required_columns(self, table_name: str) -> List[str]:
         """Get list of required (non-nullable) columns"""
-        columns = self.get_table_columns(table_name)
-        required = []
-        
-        for col_name, col_def in columns.items():
-            if not col_def.get('nullable', True):
-                required.append(col_name)
-        
-        return required
+        return list(self.get_table_validator(table_name).required_columns)
     
     def get_unique_columns(self, table_name: str) -> List[str]:
         """Get list of unique columns"""
-        columns = self.get_table_columns(table_name)
-        unique = []
-        
-        for col_name, col_def in columns.items():
-            if col_def.get('unique', False):
-                unique.append(col_name)
-        
-        return unique
+        return list(self.get_table_validator(table_name).unique_columns)
     
     def get_primary_key_columns(self, table_name: str) -> List[str]:
         """Get primary key columns"""
-        columns = self.get_table_columns(table_name)
-        pk_columns = []
-        
-        for col_name, col_def in columns.items():
-            if col_def.get('primary_key', False):
-                pk_columns.append(col_name)
-        
-        return pk_columns
+        return list(self.get_table_validator(table_name).primary_key_columns)
     
     def get_foreign_key_columns(self, table_name: str) -> Dict[str, str]:
         """Get foreign key columns and their references"""
-        columns = self.get_table_columns(table_name)
-        fk_columns = {}
-        
-        for col_name, col_def in columns.items():
-            if 'foreign_key' in col_def:
-                fk_columns[col_name] = col_def['foreign_key']
-        
-        return fk_columns
+        return dict(self.get_table_validator(table_name).foreign_keys)
     
     def validate_column_exists(self, table_name: str, column_name: str) -> bool:
         """Check if column exists in table schema"""
-        columns = self.get_table_columns(table_name)
-        return column_name in columns
+        return column_name in self.get_table_validator(table_name).columns
     
     def get_column_type(self, table_name: str, column_name: str) -> Optional[str]:
         """Get column data type"""
-        columns = self.get_table_columns(table_name)
-        col_def = columns.get(column_name, {})
-        return col_def.get('type')
+        rule = self._get_column_rule(table_name, column_name)
+        return (rule.type or None) if rule else None
     
     def is_column_nullable(self, table_name: str, column_name: str) -> bool:
         """Check if column allows NULL values"""
-        columns = self.get_table_columns(table_name)
-        col_def = columns.get(column_name, {})
-        return col_def.get('nullable', True)
+        rule = self._get_column_rule(table_name, column_name)
+        return rule.nullable if rule else True
     
     def get_column_default(self, table_name: str, column_name: str) -> Any:
         """Get column default value"""
-        columns = self.get_table_columns(table_name)
-        col_def = columns.get(column_name, {})
-        return col_def.get('default')
+        rule = self._get_column_rule(table_name, column_name)
+        return rule.default if rule else None
     
     def get_all_importable_tables(self) -> List[str]:
         """Get list of tables that can be imported to"""
@@ -151,13 +139,14 @@ class TableImportSchemaService:
             return result
         
         # Get table info
-        table_columns = self.get_table_columns(table_name)
-        required_columns = self.get_required_columns(table_name)
+        validator = self.get_table_validator(table_name)
+        table_columns = validator.columns
+        required_columns = validator.required_columns
         
         # Check mapped columns exist
         mapped_table_columns = list(column_mapping.values())
         for table_col in mapped_table_columns:
-            if table_col and not self.validate_column_exists(table_name, table_col):
+            if table_col and table_col not in table_columns:
                 result['invalid_columns'].append(table_col)
                 result['errors'].append(f"Column '{table_col}' does not exist in table '{table_name}'")
         
@@ -179,27 +168,16 @@ class TableImportSchemaService:
     
     def get_column_validation_rules(self, table_name: str, column_name: str) -> Dict[str, Any]:
         """Get validation rules for specific column"""
-        columns = self.get_table_columns(table_name)
-        col_def = columns.get(column_name, {})
-        
-        rules = {
-            'required': not col_def.get('nullable', True),
-            'type': col_def.get('type', 'NVARCHAR(255)'),
-            'unique': col_def.get('unique', False),
-            'foreign_key': col_def.get('foreign_key'),
-            'default': col_def.get('default'),
-            'max_length': None
-        }
-        
-        # Extract max length from type if applicable
-        if 'NVARCHAR' in rules['type'] and '(' in rules['type']:
-            try:
-                max_length_str = rules['type'].split('(')[1].split(')')[0]
-                rules['max_length'] = int(max_length_str)
-            except (ValueError, IndexError):
-                pass
+        rule = self._get_column_rule(table_name, column_name) or _DEFAULT_COLUMN_RULE
         
-        return rules
+        return {
+            'required': not rule.nullable,
+            'type': rule.type or _DEFAULT_COLUMN_RULE.type,
+            'unique': rule.unique,
+            'foreign_key': rule.foreign_key,
+            'default': rule.default,
+            'max_length': rule.max_length
+        }
     
     def suggest_column_mapping(self, table_name: str, excel_columns: List[str]) -> Dict[str, Optional[str]]:
         """Suggest column mapping between Excel and table columns"""
@@ -240,4 +218,7 @@ class TableImportSchemaService:
             
             mapping[excel_col] = best_match
         
-        return mapping
\ No newline at end of file
+        return mapping
+
+
+table_import_schema_service = TableImportSchemaService()
@@ -0,0 +1,392 @@
+# app/services/table_validator.py
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from decimal import Decimal
+from functools import cached_property, lru_cache
+from operator import itemgetter, methodcaller
+from typing import Annotated, Any, Dict, Iterable, List, Optional, Tuple, Type, Union
+import re
+
+import numpy as np
+import pandas as pd
+from typing_extensions import NotRequired, TypedDict
+from pydantic import (
+    AfterValidator, BaseModel, BeforeValidator, ConfigDict, Field, StringConstraints, TypeAdapter,
+    ValidationError, create_model
+)
+
+_TYPE_LENGTH_RE = re.compile(r'\((\d+)\)')
+_DECIMAL_PRECISION_RE = re.compile(r'\((\d+)\s*,\s*(\d+)\)')
+# Векторна перевірка колонки: значення за цими шаблонами pydantic приймає завжди,
+# решта (підозрілі) перевіряється в pydantic - тому шаблони вужчі за те, що він приймає
+_INT_PATTERN = r'-?[0-9]{1,18}'
+_FLOAT_PATTERN = r'-?[0-9]{1,300}(?:\.[0-9]+)?'
+_DECIMAL_PATTERN = r'-?[0-9]+(?:\.[0-9]+)?'
+_BOOL_LITERALS = ['0', '1', 'true', 'false', 'yes', 'no', 'on', 'off', 'y', 'n', 't', 'f']
+# Діапазони цілих типів SQL Server
+_INT_BOUNDS = {
+    'TINYINT': (0, 2 ** 8 - 1),
+    'SMALLINT': (-2 ** 15, 2 ** 15 - 1),
+    'INT': (-2 ** 31, 2 ** 31 - 1),
+    'BIGINT': (-2 ** 63, 2 ** 63 - 1),
+}
+# Числа в текстових колонках (JSON {"name": 5}, числові default з YAML) приймаються як рядки
+_ROW_CONFIG = ConfigDict(coerce_numbers_to_str=True)
+
+
+def _column_values(data: List[Dict], column: str) -> np.ndarray:
+    return np.fromiter(map(methodcaller('get', column), data), dtype=object, count=len(data))
+
+
+def _type_kind(field_type: str) -> str:
+    """Тип SQL -> вид перевірки/перетворення (порядок перевірок як у валідації імпорту)"""
+    if 'INT' in field_type:
+        return 'int'
+    if 'DECIMAL' in field_type or 'FLOAT' in field_type:
+        return 'decimal'
+    if 'BIT' in field_type:
+        return 'bit'
+    if 'DATE' in field_type:
+        return 'date'
+    if 'NVARCHAR' in field_type:
+        return 'text'
+    return 'other'
+
+
+# Дати в колонці імпорту часто повторюються, а розбір pandas повільний
+@lru_cache(maxsize=4096)
+def _parse_datetime(text: str) -> datetime:
+    value = pd.Timestamp(text)
+    if pd.isna(value):
+        raise ValueError(f"Invalid datetime value: {text}")
+    return value.to_pydatetime()
+
+
+# ISO 8601 розбирає pydantic-core, інші формати (02.01.2024) - pandas
+_DATETIME = Annotated[
+    Union[datetime, Annotated[str, AfterValidator(_parse_datetime)]],
+    Field(union_mode='left_to_right')
+]
+
+
+@dataclass(frozen=True)
+class ColumnRule:
+    """Скомпільоване правило колонки: тип, довжина, nullable, default і FK розібрані один раз"""
+    name: str
+    type: str
+    kind: str
+    max_length: Optional[int] = None
+    nullable: bool = True
+    unique: bool = False
+    primary_key: bool = False
+    auto_increment: bool = False
+    default: Any = None
+    foreign_key: Optional[str] = None
+    # Значення для порожньої клітинки: літерал default з YAML (GETDATE() тощо - вираз SQL, не підставляємо)
+    fill_value: Any = None
+
+    @classmethod
+    def compile(cls, name: str, col_def: Dict[str, Any]) -> "ColumnRule":
+        field_type = (col_def.get('type') or '').upper()
+        kind = _type_kind(field_type)
+        max_length = None
+        if kind == 'text':
+            # NVARCHAR(MAX) - без обмеження
+            length_match = _TYPE_LENGTH_RE.search(field_type)
+            max_length = int(length_match.group(1)) if length_match else None
+
+        rule = cls(
+            name=name,
+            type=col_def.get('type') or '',
+            kind=kind,
+            max_length=max_length,
+            nullable=col_def.get('nullable', True),
+            unique=col_def.get('unique', False),
+            primary_key=col_def.get('primary_key', False),
+            auto_increment=col_def.get('auto_increment', False),
+            default=col_def.get('default'),
+            foreign_key=col_def.get('foreign_key'),
+        )
+
+        default = rule.default
+        if default is not None and not (isinstance(default, str) and '(' in default):
+            try:
+                rule = replace(rule, fill_value=rule.validate(default))
+            except ValidationError:
+                pass
+        return rule
+
+    @property
+    def references(self) -> Optional[Tuple[str, str]]:
+        """FK "cat_users.id" -> ("cat_users", "id")"""
+        if not self.foreign_key or '.' not in self.foreign_key:
+            return None
+        table, column = self.foreign_key.rsplit('.', 1)
+        return table, column
+
+    @property
+    def value_required(self) -> bool:
+        """NOT NULL без літерала default і автоінкременту - при записі колонки значення має прийти з даних"""
+        return not self.nullable and self.fill_value is None and not self.auto_increment
+
+    def annotation(self) -> Any:
+        """Тип pydantic з обмеженнями типу SQL (перевіряються в pydantic-core)"""
+        field_type = self.type.upper()
+        if self.kind == 'int':
+            low, high = _INT_BOUNDS.get(field_type, _INT_BOUNDS['BIGINT'])
+            return Annotated[int, Field(ge=low, le=high)]
+        if self.kind == 'decimal':
+            # NaN/Infinity SQL Server не зберігає
+            if 'FLOAT' in field_type:
+                return Annotated[float, Field(allow_inf_nan=False)]
+            precision = _DECIMAL_PRECISION_RE.search(field_type)
+            if precision is None:
+                return Annotated[Decimal, Field(allow_inf_nan=False)]
+            # DECIMAL(p,s): до p-s цифр цілої частини, зайві знаки після коми SQL Server округлює сам
+            bound = Decimal(10) ** (int(precision.group(1)) - int(precision.group(2)))
+            return Annotated[Decimal, Field(gt=-bound, lt=bound)]
+        if self.kind == 'bit':
+            return bool
+        if self.kind == 'date':
+            return _DATETIME
+        if self.kind == 'text':
+            return Annotated[str, StringConstraints(max_length=self.max_length)]
+        return Any
+
+    def _prepare(self, value: Any) -> Any:
+        """Рядки обрізаються; порожня клітинка - fill_value (None, якщо default немає)"""
+        if isinstance(value, str):
+            value = value.strip()
+            if value == '':
+                value = None
+        return self.fill_value if value is None else value
+
+    def field_annotation(self) -> Any:
+        """Тип поля рядка: обов'язкова колонка - без None, інші - Optional"""
+        annotation = self.annotation() if self.value_required else Optional[self.annotation()]
+        return Annotated[annotation, BeforeValidator(self._prepare)]
+
+    @cached_property
+    def adapter(self) -> TypeAdapter:
+        return TypeAdapter(self.field_annotation(), config=_ROW_CONFIG)
+
+    def validate(self, value: Any) -> Any:
+        """Значення клітинки/поля -> параметр для драйвера, ValidationError якщо не проходить тип колонки"""
+        return self.adapter.validate_python(value)
+
+    def screen(self, values: np.ndarray) -> np.ndarray:
+        """Перевірка всієї колонки масками pandas: True - значення може не пройти validate.
+
+        Маски пропускають лише значення, які validate точно приймає; решту перевіряє pydantic.
+        """
+        suspect = np.zeros(len(values), dtype=bool)
+        if self.kind == 'other':
+            return suspect
+        is_text = np.fromiter((type(value) is str for value in values), dtype=bool, count=len(values))
+        # Числа, дати тощо (не з файлу) - одразу в pydantic
+        suspect[~is_text & np.not_equal(values, None)] = True
+
+        positions = np.flatnonzero(is_text)
+        text = pd.Series(values[positions], index=positions, dtype=object).str.strip()
+        blank = text == ''
+        if self.value_required:
+            suspect[np.flatnonzero(~is_text & np.equal(values, None))] = True
+            suspect[text.index[blank]] = True
+        text = text[~blank]
+        if text.empty:
+            return suspect
+
+        field_type = self.type.upper()
+        if self.kind == 'int':
+            valid = text.str.fullmatch(_INT_PATTERN)
+            low, high = _INT_BOUNDS.get(field_type, _INT_BOUNDS['BIGINT'])
+            numbers = pd.to_numeric(text[valid], errors='coerce')
+            valid[valid] = (numbers >= low) & (numbers <= high)
+        elif self.kind == 'decimal':
+            precision = _DECIMAL_PRECISION_RE.search(field_type)
+            if 'FLOAT' in field_type:
+                pattern = _FLOAT_PATTERN
+            elif precision is None:
+                pattern = _DECIMAL_PATTERN
+            else:
+                # DECIMAL(p,s): не більше p-s цифр цілої частини
+                integer_digits = int(precision.group(1)) - int(precision.group(2))
+                pattern = (rf'-?[0-9]{{1,{integer_digits}}}(?:\.[0-9]+)?' if integer_digits > 0
+                           else r'-?0(?:\.[0-9]+)?')
+            valid = text.str.fullmatch(pattern)
+        elif self.kind == 'bit':
+            valid = text.str.lower().isin(_BOOL_LITERALS)
+        elif self.kind == 'date':
+            # Дати в колонці повторюються - кожне унікальне значення перевіряється один раз
+            invalid = {value for value in text.unique() if not self.is_valid(value)}
+            valid = ~text.isin(invalid)
+        elif self.max_length is not None:
+            valid = text.str.len() <= self.max_length
+        else:
+            return suspect
+
+        suspect[text.index[~valid.astype(bool)]] = True
+        return suspect
+
+    def is_valid(self, value: Any) -> bool:
+        try:
+            self.validate(value)
+        except ValidationError:
+            return False
+        return True
+
+    def error_message(self, error_type: str, value: Any) -> str:
+        """Помилка pydantic -> повідомлення імпорту (однакове для попереднього перегляду і запису)"""
+        text = value.strip() if isinstance(value, str) else value
+        if text is None or text == '':
+            return "Value is required"
+        if error_type == 'string_too_long':
+            return f"Value too long: {len(text)} > {self.max_length}"
+        if self.kind == 'bit':
+            return f"Invalid boolean value: {text}"
+        return f"Invalid {self.type.upper()} value: {text}"
+
+
+@dataclass(frozen=True)
+class TableValidator:
+    """Скомпільовані правила всіх колонок таблиці - будуються один раз і кешуються"""
+    table_name: str
+    columns: Dict[str, ColumnRule] = field(default_factory=dict)
+    required_columns: Tuple[str, ...] = ()
+    unique_columns: Tuple[str, ...] = ()
+    primary_key_columns: Tuple[str, ...] = ()
+    foreign_keys: Dict[str, str] = field(default_factory=dict)
+    # Згенеровані моделі pydantic і TypeAdapter-и, ключ - (вид, набір колонок)
+    _models: Dict[Tuple[str, Tuple[str, ...]], Any] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def column_errors(self, data: List[Dict], column_mapping: Dict[str, str]) -> Dict[int, List[str]]:
+        """Помилки по рядках (0-based) для рядків файлу з колонками column_mapping (колонка файлу -> таблиці).
+
+        Кожна колонка перевіряється цілком масками (ColumnRule.screen), у pydantic - лише підозрілі рядки.
+        """
+        mapping = {source_col: table_col for source_col, table_col in column_mapping.items()
+                   if table_col and table_col in self.columns}
+        suspect = np.zeros(len(data), dtype=bool)
+        for source_col, table_col in mapping.items():
+            suspect |= self.columns[table_col].screen(_column_values(data, source_col))
+
+        rows = np.flatnonzero(suspect)
+        items = [{table_col: data[row_idx].get(source_col) for source_col, table_col in mapping.items()}
+                 for row_idx in rows]
+        row_errors = self.row_errors(items, list(dict.fromkeys(mapping.values())))
+        return {int(rows[idx]): errors for idx, errors in row_errors.items()}
+
+    def row_model(self, columns: Optional[Iterable[str]] = None) -> Type[BaseModel]:
+        """Модель pydantic запису таблиці (усі колонки або підмножина), будується один раз на набір колонок"""
+        columns = tuple(self.columns) if columns is None else tuple(columns)
+        key = ('model', columns)
+        model = self._models.get(key)
+        if model is None:
+            fields = {}
+            for idx, name in enumerate(columns):
+                rule = self.columns.get(name)
+                # Колонки з "_" на початку pydantic вважає приватними - такі поля доступні лише через alias
+                attr = name if name.isidentifier() and not name.startswith('_') else f"column_{idx}"
+                if rule is None:
+                    fields[attr] = (Any, Field(None, alias=name))
+                elif rule.value_required:
+                    fields[attr] = (rule.field_annotation(), Field(alias=name))
+                else:
+                    fields[attr] = (rule.field_annotation(), Field(rule.fill_value, alias=name))
+            model = self._models[key] = create_model(
+                f"{self.table_name or 'table'}_row",
+                __config__=ConfigDict(populate_by_name=True, protected_namespaces=(), **_ROW_CONFIG),
+                **fields
+            )
+        return model
+
+    def _rows_adapter(self, columns: Tuple[str, ...]) -> TypeAdapter:
+        """TypeAdapter списку рядків-TypedDict: без створення об'єкта моделі на кожен рядок"""
+        key = ('rows', columns)
+        adapter = self._models.get(key)
+        if adapter is None:
+            fields = {}
+            for name in columns:
+                rule = self.columns.get(name)
+                if rule is None:
+                    fields[name] = NotRequired[Any]
+                elif rule.value_required:
+                    fields[name] = rule.field_annotation()
+                else:
+                    fields[name] = NotRequired[rule.field_annotation()]
+            row_type = TypedDict(f"{self.table_name or 'table'}_row", fields)
+            row_type.__pydantic_config__ = _ROW_CONFIG
+            adapter = self._models[key] = TypeAdapter(List[row_type])
+        return adapter
+
+    def validate_payload(self, payload: Dict[str, Any], columns: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Перевірка і приведення типів одного запису (тіло API запиту), ValidationError якщо не пройшов"""
+        return self.row_model(columns).model_validate(payload).model_dump(by_alias=True)
+
+    def row_errors(self, items: List[Dict], columns: List[str]) -> Dict[int, List[str]]:
+        """Лише помилки невалідних рядків (без приведених значень) - один прохід pydantic-core"""
+        try:
+            self._rows_adapter(tuple(columns)).validate_python(items)
+        except ValidationError as e:
+            return self._error_messages(e, items)
+        return {}
+
+    def validate_rows(self, items: List[Dict], columns: List[str]) -> Tuple[List[int], List[Tuple], Dict[int, List[str]]]:
+        """Пакетна перевірка і приведення рядків у pydantic-core (імпорт, запис).
+
+        Повертає номери валідних рядків, їх значення (кортежі в порядку columns) і помилки невалідних рядків.
+        """
+        columns = tuple(columns)
+        adapter = self._rows_adapter(columns)
+        row_errors: Dict[int, List[str]] = {}
+        try:
+            validated = adapter.validate_python(items)
+            valid = list(range(len(items)))
+        except ValidationError as e:
+            row_errors = self._error_messages(e, items)
+            # Валідні рядки проходять повторно, щоб отримати приведені значення
+            valid = [idx for idx in range(len(items)) if idx not in row_errors]
+            validated = adapter.validate_python([items[idx] for idx in valid])
+
+        # Відсутні в рядку необов'язкові колонки - fill_value
+        defaults = {name: getattr(self.columns.get(name), 'fill_value', None) for name in columns}
+        if len(columns) > 1:
+            getter = itemgetter(*columns)
+        else:
+            getter = lambda row: tuple(row[name] for name in columns)
+        rows = [getter(row if len(row) == len(columns) else {**defaults, **row}) for row in validated]
+        return valid, rows, row_errors
+
+    def _error_messages(self, exc: ValidationError, items: List[Dict]) -> Dict[int, List[str]]:
+        """Помилки pydantic -> повідомлення імпорту по рядках"""
+        row_errors: Dict[int, List[str]] = {}
+        reported = set()
+        for error in exc.errors(include_url=False, include_input=False):
+            row_idx, *loc = error['loc']
+            # Дата дає помилку на кожен варіант union - одне повідомлення на поле
+            if loc and (row_idx, loc[0]) in reported:
+                continue
+            if loc:
+                reported.add((row_idx, loc[0]))
+            rule = self.columns.get(loc[0]) if loc else None
+            if rule is None:
+                message = f"Field '{loc[0]}': {error['msg']}" if loc else error['msg']
+            else:
+                message = f"Field '{loc[0]}': {rule.error_message(error['type'], items[row_idx].get(loc[0]))}"
+            row_errors.setdefault(row_idx, []).append(message)
+        return row_errors
+
+
+def compile_table_validator(table_name: str, table_def: Dict[str, Any]) -> TableValidator:
+    """Описи колонок таблиці (resolved_tables) -> TableValidator"""
+    columns = {name: ColumnRule.compile(name, col_def or {}) for name, col_def in (table_def.get('columns') or {}).items()}
+    return TableValidator(
+        table_name=table_name,
+        columns=columns,
+        required_columns=tuple(name for name, rule in columns.items() if not rule.nullable),
+        unique_columns=tuple(name for name, rule in columns.items() if rule.unique),
+        primary_key_columns=tuple(name for name, rule in columns.items() if rule.primary_key),
+        foreign_keys={name: rule.foreign_key for name, rule in columns.items() if rule.foreign_key is not None},
+    )
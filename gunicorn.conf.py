@@ -1,12 +1,15 @@
 # Gunicorn конфігурація для продакшену
 import multiprocessing
+import os
 
 # Server socket
 bind = "0.0.0.0:8000"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1  # Автоматично по кількості CPU
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))  # WEB_CONCURRENCY або по кількості CPU
+# Кількість процесів для Settings.WORKERS: бюджет DB_MAX_CONNECTIONS ділиться між ними
+os.environ["WORKERS"] = str(workers)
 worker_class = "uvicorn.workers.UvicornWorker"
 worker_connections = 1000
 max_requests = 1000
@@ -1,5 +1,6 @@
 import sys
 import os
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 import zipfile
@@ -72,15 +73,32 @@ async def lifespan(app: FastAPI):
     from app.db.database import db_manager
     try:
         await db_manager.create_pool()
+        await db_manager.create_read_pool()
         logger.info("Database pool initialized")
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
         raise
     
+    # Без окремого процесу воркера задачі імпорту (і heartbeat/повтор завислих) виконуються тут
+    import_worker = import_worker_task = None
+    if not settings.IMPORT_USE_WORKER:
+        from app.services.import_worker import create_api_import_worker
+        import_worker = create_api_import_worker()
+        import_worker_task = asyncio.create_task(import_worker.run())
+    
     yield
     
     # Shutdown
+    if import_worker_task is not None:
+        import_worker.stop()
+        await import_worker_task
     await db_manager.close_pool()
+    
+    from app.services.excel_parsing_service import excel_parser
+    excel_parser.shutdown()
+
+    from app.core.security import shutdown_password_executor
+    shutdown_password_executor()
     logger.info("Shutting down server")
 
 # FastAPI app
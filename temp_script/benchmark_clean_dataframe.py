@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark ExcelImportService._clean_dataframe against the previous per-column cleaning
+
+Usage: python temp_script/benchmark_clean_dataframe.py [rows] [columns]
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.excel_import_service import ExcelImportService
+
+
+def legacy_clean_dataframe(service: ExcelImportService, df: pd.DataFrame) -> pd.DataFrame:
+    """Попередня реалізація: кілька копій кожної колонки"""
+    df = df.dropna(how='all')
+    df.columns = [legacy_clean_column_name(col) for col in df.columns]
+    df.columns = service._handle_duplicate_columns(df.columns)
+    for col in df.columns:
+        if df[col].dtype == 'object' or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype(str).str.strip()
+            df[col] = df[col].replace('', None)
+    return df
+
+
+def legacy_clean_column_name(column_name) -> str:
+    if pd.isna(column_name):
+        return "unnamed_column"
+    clean_name = str(column_name).strip().replace(' ', '_').replace('-', '_').replace('.', '_')
+    clean_name = ''.join(c for c in clean_name if c.isalnum() or c == '_')
+    if clean_name and clean_name[0].isdigit():
+        clean_name = f"col_{clean_name}"
+    return clean_name if clean_name else "unnamed_column"
+
+
+def build_csv(rows: int, columns: int) -> bytes:
+    """CSV з пробілами навколо значень і ~10% порожніх клітинок"""
+    rng = np.random.default_rng(42)
+    data = {}
+    for idx in range(columns):
+        values = np.char.add(np.char.add(' value ', rng.integers(0, 100000, rows).astype(str)), ' ')
+        values[rng.random(rows) < 0.1] = ''
+        data[f"Column {idx}"] = values
+    return pd.DataFrame(data).to_csv(index=False).encode()
+
+
+def timed(label: str, func, repeat: int = 3) -> float:
+    best = min(_run(func) for _ in range(repeat))
+    print(f"  {label:<10} {best:8.3f}s")
+    return best
+
+
+def _run(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    service = ExcelImportService()
+
+    print(f"Building CSV: {rows} rows x {columns} columns")
+    content = build_csv(rows, columns)
+    df = pd.read_csv(io.BytesIO(content), dtype=str, na_filter=False)
+
+    print(f"_clean_dataframe (pandas {pd.__version__}, best of 3):")
+    legacy = timed("legacy", lambda: legacy_clean_dataframe(service, df.copy()))
+    current = timed("current", lambda: service._clean_dataframe(df.copy()))
+    print(f"  speedup    {legacy / current:8.2f}x")
+
+    # На pandas 3 replace('', None) в str-колонці дає NaN - порівнюємо як None
+    expected = legacy_clean_dataframe(service, df.copy()).astype(object).head(1000)
+    expected = expected.where(expected.notna(), None).to_dict('records')
+    actual = service._clean_dataframe(df.copy()).to_dict('records')[:1000]
+    print(f"  same output (first 1000 rows): {expected == actual}")
+
+
+if __name__ == "__main__":
+    main()
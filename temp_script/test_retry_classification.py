@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Classification of pyodbc errors for transaction retries (app/db/retry.py)
+
+Usage: python temp_script/test_retry_classification.py  (or pytest temp_script/test_retry_classification.py)
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.retry import is_connection_error, native_error_numbers, transient_error_code
+
+
+class OdbcError(Exception):
+    """Як pyodbc.Error: args = (SQLSTATE, повідомлення)"""
+
+
+def test_single_record_deadlock():
+    exc = OdbcError('40001', "[40001] [Microsoft][ODBC Driver 17 for SQL Server][SQL Server]Transaction (Process ID 55) "
+                             "was deadlocked on lock resources with another process. (1205) (SQLExecDirectW)")
+    assert native_error_numbers(exc) == ['1205']
+    assert transient_error_code(exc) == '1205'
+
+
+def test_multi_record_lock_timeout():
+    exc = OdbcError('HY000', "[HY000] [Microsoft][ODBC Driver 17 for SQL Server][SQL Server]Lock request time out "
+                             "period exceeded. (1222) (SQLExecDirectW); [01000] [Microsoft][ODBC Driver 17 for SQL Server]"
+                             "[SQL Server]The statement has been terminated. (3621)")
+    assert native_error_numbers(exc) == ['1222', '3621']
+    assert transient_error_code(exc) == '1222'
+
+
+def test_multi_record_function_at_end():
+    exc = OdbcError('40001', "[40001] [Microsoft][SQL Server]deadlock victim. (1205); "
+                             "[01000] [Microsoft][SQL Server]The statement has been terminated. (3621) (SQLExecDirectW)")
+    assert native_error_numbers(exc) == ['1205', '3621']
+    assert transient_error_code(exc) == '1205'
+
+
+def test_number_in_data_value_is_ignored():
+    exc = OdbcError('23000', "[23000] [Microsoft][ODBC Driver 17 for SQL Server][SQL Server]Violation of UNIQUE KEY "
+                             "constraint. The duplicate key value is (1205). (2627) (SQLExecDirectW)")
+    assert native_error_numbers(exc) == ['2627']
+    assert transient_error_code(exc) is None
+
+
+def test_connection_loss():
+    exc = OdbcError('08S01', "[08S01] [Microsoft][ODBC Driver 17 for SQL Server]Communication link failure (10054) "
+                             "(SQLExecDirectW)")
+    assert transient_error_code(exc) == '08S01'
+    assert is_connection_error(exc)
+
+
+def test_not_pyodbc_error():
+    assert transient_error_code(ValueError('value (1205)')) is None
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith('test_') and callable(test)]
+    for name, test in tests:
+        test()
+        print(f"ok {name}")